@@ -1,17 +1,39 @@
 import os
 import asyncio
+import mmap
+import time
 import uuid
 
+import orjson
 from agents import Agent, function_tool, Runner, SQLiteSession
-from sqlalchemy import text
+from sqlalchemy import TextClause, text
 from db import (
-    create_engine_from_config,
+    create_async_engine_from_config,
     load_database_config_from_args,
 )
 
-BASE_DIR = os.path.join(os.path.dirname(__file__), "../data")
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), "../data"))
 MODEL = "gpt-5-mini"
 
+_ENGINE = None
+_ENGINE_LOCK = asyncio.Lock()
+
+
+async def _get_engine():
+    """Create the shared async SQLAlchemy engine on first use and reuse it afterwards."""
+    global _ENGINE
+    if _ENGINE is None:
+        async with _ENGINE_LOCK:
+            if _ENGINE is None:
+                config = load_database_config_from_args(None)
+                _ENGINE = create_async_engine_from_config(
+                    config,
+                    pool_size=10,
+                    max_overflow=20,
+                    pool_recycle=1800,
+                )
+    return _ENGINE
+
 
 DB_INSTRUCTIONS = """
 Handle company, stock price and SMA event information.
@@ -38,18 +60,80 @@ Each daily report contains:
 - Stock traded with high volume.
 """
 
+# Follow-up agent turns often repeat the exact same SQL; cache results for up
+# to a minute so those turns skip the database entirely.
+_QUERY_CACHE: dict[tuple[str, int], list[dict]] = {}
+_QUERY_CACHE_SIZE = 256
+_QUERY_CACHE_TTL_SECONDS = 60
+
+# Reuse TextClause objects when the model repeats the same SQL literal, so the
+# construction and dialect compile step only happens once per unique query.
+# Bounded like _QUERY_CACHE: the keys are model-generated SQL, so an uncapped
+# dict grows for the life of the process.
+_STMT_CACHE: dict[str, TextClause] = {}
+_STMT_CACHE_SIZE = 256
+
+
+def _query_cache_key(sql: str) -> tuple[str, int]:
+    normalized = " ".join(sql.split()).lower()
+    bucket = int(time.time() // _QUERY_CACHE_TTL_SECONDS)
+    return normalized, bucket
+
+
+async def _run_query(sql: str) -> list[dict]:
+    key = _query_cache_key(sql)
+    cached = _QUERY_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    engine = await _get_engine()
+    stmt = _STMT_CACHE.get(sql)
+    if stmt is None:
+        while len(_STMT_CACHE) >= _STMT_CACHE_SIZE:
+            _STMT_CACHE.pop(next(iter(_STMT_CACHE)))
+        stmt = _STMT_CACHE[sql] = text(sql)
+    async with engine.connect() as connection:
+        result = await connection.stream(stmt)
+        rows = [dict(row) async for row in result.mappings()]
+
+    while len(_QUERY_CACHE) >= _QUERY_CACHE_SIZE:
+        _QUERY_CACHE.pop(next(iter(_QUERY_CACHE)))
+    _QUERY_CACHE[key] = rows
+    return rows
+
+
+def _to_json(payload: object) -> str:
+    """Serialize tool output straight to JSON; orjson handles dates natively.
+
+    default=str covers driver types orjson refuses, notably the Decimal
+    values aiomysql returns for aggregates over integer columns.
+    """
+    return orjson.dumps(payload, default=str).decode("utf-8")
+
+
 @function_tool
-def query_stock_data(sql: str) -> list[dict]:
+async def query_stock_data(sql: str) -> str:
     """Returns stock prices and events using SQL query.
+
+    Output is a JSON array of row objects.
     """
-    config = load_database_config_from_args(None)
-    engine = create_engine_from_config(config)
-    data = []
-    with engine.connect() as connection:
-        result = connection.execute(text(sql))
-        for row in result.mappings():
-            data.append(row)
-        return data
+    return _to_json(await _run_query(sql))
+
+
+@function_tool
+async def query_stock_data_batch(sqls: list[str]) -> str:
+    """Run several independent SQL queries concurrently.
+
+    Output is a JSON array of result sets in the same order as the input
+    queries.
+    """
+    async with asyncio.TaskGroup() as group:
+        tasks = [group.create_task(_run_query(sql)) for sql in sqls]
+    return _to_json([task.result() for task in tasks])
+
+
+# Below this size the mmap setup cost outweighs a plain buffered read.
+_MMAP_THRESHOLD = 64 * 1024
 
 
 @function_tool
@@ -57,16 +141,21 @@ def read_report_date(report_date: str) -> str:
     """Read stock report for date: YYYYmmdd.
     """
     file_path = os.path.join(BASE_DIR, f"report_{report_date}.txt")
-    if not os.path.exists(file_path):
+    try:
+        with open(file_path, "rb") as handle:
+            if os.fstat(handle.fileno()).st_size < _MMAP_THRESHOLD:
+                return handle.read().decode("utf-8")
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[:].decode("utf-8")
+    except FileNotFoundError:
         return "No report found!"
-    return open(file_path, "+rt").read()
 
 
 databse_agent = Agent(
     name="Stock Database Agent",
     instructions=DB_INSTRUCTIONS,
     model=MODEL,
-    tools = [query_stock_data],
+    tools = [query_stock_data, query_stock_data_batch],
 )
 
 _report_agent = Agent(
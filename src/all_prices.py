@@ -3,13 +3,20 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import csv
 import logging
 import os
+import tempfile
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta
-from typing import Dict, Iterable, Iterator, List, Set
+from functools import lru_cache
+from typing import Dict, Iterator, List, Sequence, Set
 from zoneinfo import ZoneInfo
 
+import aiohttp
 from massive import RESTClient
 from massive.rest import models as massive_models
 from sqlalchemy import (
@@ -17,26 +24,46 @@ from sqlalchemy import (
     Column,
     Date,
     Float,
+    Index,
     MetaData,
     String,
     Table,
     func,
     select,
+    text,
 )
 from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 
 from db import (
     add_config_argument,
     create_engine_from_config,
+    ensure_index,
     load_database_config_from_args,
     reflect_table,
 )
 
 LOGGER = logging.getLogger(__name__)
 
+GROUPED_AGGS_URL = "https://api.polygon.io/v2/aggs/grouped/locale/us/market/stocks/{date}"
+MAX_CONCURRENT_REQUESTS = 5
 
-def parse_args() -> argparse.Namespace:
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_MS_PER_DAY = 86_400_000
+
+# Above this row count, staging through LOAD DATA LOCAL INFILE beats the
+# multi-VALUES upsert path by a wide margin.
+BULK_LOAD_THRESHOLD = 5000
+
+# MySQL error code raised when the server has local_infile=OFF (the 8.0
+# default). Set once a bulk load fails with it, so later batches go straight
+# to the multi-VALUES path instead of re-staging a temp file per day.
+_ER_LOAD_INFILE_DISABLED = 3948
+_bulk_load_disabled = False
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     add_config_argument(parser)
     parser.add_argument(
@@ -50,17 +77,23 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Date (YYYY-MM-DD). Default: today.",
     )
+    parser.add_argument(
+        "--start-date",
+        type=_parse_date,
+        default=None,
+        help="Backfill start date (YYYY-MM-DD). Fetches every day up to --date concurrently.",
+    )
     parser.add_argument(
         "--chunk-size",
         type=int,
-        default=500,
-        help="Rows to upsert per batch (default: %(default)s)",
+        default=5000,
+        help="Upper bound on rows per upsert batch; clamped to server limits (default: %(default)s)",
     )
     parser.add_argument(
-        "--sleep",
+        "--requests-per-second",
         type=float,
-        default=0.25,
-        help="Seconds to sleep between API calls (default: %(default)s)",
+        default=4.0,
+        help="Maximum Polygon API request rate (default: %(default)s; 0 disables limiting)",
     )
     parser.add_argument(
         "--adjusted",
@@ -80,7 +113,7 @@ def parse_args() -> argparse.Namespace:
         default=os.getenv("LOG_LEVEL", "INFO"),
         help="Logging level (default: %(default)s)",
     )
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 def _parse_date(value: str) -> date:
@@ -101,11 +134,23 @@ def create_tables(engine: Engine) -> Table:
         Column("volume", BigInteger),
         Column("vwap", Float),
         Column("transactions", BigInteger),
+        # Covering index for date-windowed report scans (reports filter on
+        # trade_date and read symbol/close), complementing the
+        # (symbol, trade_date) primary key.
+        Index("idx_prices_tradedate_symbol_close", "trade_date", "symbol", "close"),
         mysql_charset="utf8mb4",
         mysql_collate="utf8mb4_unicode_ci",
     )
 
     metadata.create_all(engine, checkfirst=True)
+    # create_all skips tables that already exist, so bring live schemas up
+    # to date explicitly.
+    ensure_index(
+        engine,
+        "prices",
+        "idx_prices_tradedate_symbol_close",
+        ("trade_date", "symbol", "close"),
+    )
     return prices
 
 
@@ -118,41 +163,134 @@ def fetch_symbols(engine: Engine) -> List[str]:
 
 
 def fetch_latest_trade_dates(engine: Engine, prices: Table) -> Dict[str, date]:
+    # A correlated MAX() per company lets MySQL do a loose index scan on the
+    # (symbol, trade_date) primary key instead of grouping the whole table.
+    companies = reflect_table(engine, "companies")
+    latest_date = (
+        select(func.max(prices.c.trade_date))
+        .where(prices.c.symbol == companies.c.symbol)
+        .scalar_subquery()
+    )
     latest: Dict[str, date] = {}
     with engine.connect() as connection:
-        result = connection.execute(
-            select(prices.c.symbol, func.max(prices.c.trade_date).label("latest_date")).group_by(prices.c.symbol)
+        result = connection.execution_options(stream_results=True, yield_per=10_000).execute(
+            select(companies.c.symbol, latest_date.label("latest_date"))
         )
         for row in result:
-            latest[row.symbol] = row.latest_date
+            if row.latest_date is not None:
+                latest[row.symbol] = row.latest_date
     return latest
 
 
-def chunked(iterable: Iterable[Dict[str, object]], size: int) -> Iterator[List[Dict[str, object]]]:
-    chunk: List[Dict[str, object]] = []
-    for item in iterable:
-        chunk.append(item)
-        if len(chunk) >= size:
-            yield chunk
-            chunk = []
-    if chunk:
-        yield chunk
+def chunked(rows: Sequence[Dict[str, object]], size: int) -> Iterator[List[Dict[str, object]]]:
+    # Slice the materialized list directly; cheaper than a yield-per-item
+    # generator when batching tens of thousands of aggregates.
+    return (list(rows[i:i + size]) for i in range(0, len(rows), size))
+
+
+def upsert_prices_bulk(engine: Engine, table: Table, rows: List[Dict[str, object]]) -> int:
+    """Upsert a large row set via LOAD DATA LOCAL INFILE into a staging table."""
+
+    column_names = [column.name for column in table.columns]
+    update_clause = ", ".join(
+        f"{name}=VALUES({name})"
+        for name in column_names
+        if not table.columns[name].primary_key
+    )
+    column_list = ", ".join(column_names)
+
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".tsv", newline="", encoding="utf-8", delete=False
+    ) as handle:
+        writer = csv.writer(handle, delimiter="\t", lineterminator="\n")
+        for row in rows:
+            writer.writerow(
+                ["\\N" if row.get(name) is None else row.get(name) for name in column_names]
+            )
+        stage_path = handle.name
+
+    try:
+        with engine.begin() as connection:
+            connection.execute(text(f"CREATE TEMPORARY TABLE {table.name}_stage LIKE {table.name}"))
+            connection.exec_driver_sql(
+                f"LOAD DATA LOCAL INFILE '{stage_path}' INTO TABLE {table.name}_stage "
+                f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({column_list})"
+            )
+            connection.execute(
+                text(
+                    f"INSERT INTO {table.name} ({column_list}) "
+                    f"SELECT {column_list} FROM {table.name}_stage "
+                    f"ON DUPLICATE KEY UPDATE {update_clause}"
+                )
+            )
+            connection.execute(text(f"DROP TEMPORARY TABLE {table.name}_stage"))
+    finally:
+        os.unlink(stage_path)
+    return len(rows)
+
+
+def effective_chunk_size(engine: Engine, table: Table, requested: int) -> int:
+    """Clamp the upsert batch size to MySQL's placeholder and packet limits.
+
+    The requested size acts as an upper bound; the server's
+    max_allowed_packet and the 65535-placeholder ceiling cap it so a batch
+    can never overflow either limit regardless of column count.
+    """
+
+    with engine.connect() as connection:
+        row = connection.execute(text("SHOW VARIABLES LIKE 'max_allowed_packet'")).fetchone()
+    max_packet = int(row[1]) if row else 4 * 1024 * 1024
+    column_count = len(table.columns)
+    # Rough upper estimate of the wire size of one bound row.
+    estimated_row_bytes = 64 * column_count
+    limit = min(65_535 // column_count, max_packet // estimated_row_bytes)
+    return max(1, min(requested, limit))
+
+
+# Bounded: each main() run builds a fresh MetaData/Table, so an unbounded
+# cache would pin one graph per run for the life of a long-running process
+# (the webapp invokes this main in-process per fetch_prices job).
+@lru_cache(maxsize=8)
+def _upsert_stmt(table: Table):
+    """Build the ON DUPLICATE KEY UPDATE statement once per table."""
+
+    stmt = mysql_insert(table)
+    update_columns = {
+        column.name: getattr(stmt.inserted, column.name)
+        for column in table.columns
+        if not column.primary_key
+    }
+    return stmt.on_duplicate_key_update(**update_columns)
 
 
 def upsert_prices(engine: Engine, table: Table, rows: List[Dict[str, object]], chunk_size: int) -> int:
     if not rows:
         return 0
 
+    global _bulk_load_disabled
+    if len(rows) > BULK_LOAD_THRESHOLD and not _bulk_load_disabled:
+        try:
+            return upsert_prices_bulk(engine, table, rows)
+        except OperationalError as exc:
+            # The client side is enabled via connect_args in db.py, but the
+            # server may still reject LOAD DATA LOCAL (local_infile=OFF is
+            # the MySQL 8.0 default); fall back to the multi-VALUES path.
+            if getattr(exc.orig, "args", (None,))[0] != _ER_LOAD_INFILE_DISABLED:
+                raise
+            _bulk_load_disabled = True
+            LOGGER.warning(
+                "Server rejected LOAD DATA LOCAL INFILE (local_infile is OFF); "
+                "falling back to multi-VALUES upserts for this run."
+            )
+
+    stmt = _upsert_stmt(table)
+
     inserted = 0
     with engine.begin() as connection:
         for batch in chunked(rows, chunk_size):
-            stmt = mysql_insert(table).values(batch)
-            update_columns = {
-                column.name: getattr(stmt.inserted, column.name)
-                for column in table.columns
-                if not column.primary_key
-            }
-            connection.execute(stmt.on_duplicate_key_update(**update_columns))
+            # executemany path: the driver coalesces each batch into a single
+            # multi-row VALUES statement instead of re-parsing per batch.
+            connection.execute(stmt, batch)
             inserted += len(batch)
     return inserted
 
@@ -162,13 +300,23 @@ def to_price_row(
     aggregate: massive_models.Agg | massive_models.GroupedDailyAgg,
     trade_date: date | None = None,
 ) -> Dict[str, object]:
-    timestamp = getattr(aggregate, "timestamp", None)
     if trade_date is None:
+        timestamp = getattr(aggregate, "timestamp", None)
         if timestamp is None:
             raise ValueError("Aggregate is missing timestamp and trade_date is not provided.")
-        trade_dt = datetime.utcfromtimestamp(timestamp / 1000).date()
+        # Pure integer arithmetic on the millisecond epoch; avoids building a
+        # datetime per row and the deprecated utcfromtimestamp.
+        trade_dt = date.fromordinal(_EPOCH_ORDINAL + timestamp // _MS_PER_DAY)
     else:
         trade_dt = trade_date
+    # Both Polygon aggregate classes define vwap/transactions, so direct
+    # attribute access avoids a getattr call per row.
+    try:
+        vwap = aggregate.vwap
+        transactions = aggregate.transactions
+    except AttributeError:
+        vwap = getattr(aggregate, "vwap", None)
+        transactions = getattr(aggregate, "transactions", None)
     return {
         "symbol": symbol,
         "trade_date": trade_dt,
@@ -177,8 +325,8 @@ def to_price_row(
         "low": aggregate.low,
         "close": aggregate.close,
         "volume": aggregate.volume,
-        "vwap": getattr(aggregate, "vwap", None),
-        "transactions": getattr(aggregate, "transactions", None),
+        "vwap": vwap,
+        "transactions": transactions,
     }
 
 
@@ -201,17 +349,131 @@ def fetch_grouped_price_rows(
         adjusted=adjusted,
     )
 
+    # Build rows inline: the grouped-daily response spans every listed ticker,
+    # so avoid a per-aggregate function call and the timestamp branch in
+    # to_price_row (trade_date is constant for the whole response).
     rows: List[Dict[str, object]] = []
+    append = rows.append
     for aggregate in aggregates:
         symbol = getattr(aggregate, "ticker", None)
         if not symbol or symbol not in symbols:
             continue
-        rows.append(to_price_row(symbol, aggregate, trade_date=target_date))
+        append(
+            {
+                "symbol": symbol,
+                "trade_date": target_date,
+                "open": aggregate.open,
+                "high": aggregate.high,
+                "low": aggregate.low,
+                "close": aggregate.close,
+                "volume": aggregate.volume,
+                "vwap": getattr(aggregate, "vwap", None),
+                "transactions": getattr(aggregate, "transactions", None),
+            }
+        )
+    return rows
+
+
+class RateLimiter:
+    """Sliding-window limiter: at most ``max_calls`` requests per ``window`` seconds.
+
+    Unlike a fixed sleep between calls, requests proceed immediately while the
+    quota allows and only wait for the remainder of the window when it is full.
+    """
+
+    def __init__(self, max_calls: int, window: float = 1.0) -> None:
+        self.max_calls = max_calls
+        self.window = window
+        self._calls: deque[float] = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            while self._calls and now - self._calls[0] >= self.window:
+                self._calls.popleft()
+            if len(self._calls) >= self.max_calls:
+                await asyncio.sleep(self.window - (now - self._calls[0]))
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.window:
+                    self._calls.popleft()
+            self._calls.append(now)
+
+
+async def afetch_grouped_price_rows(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    api_key: str,
+    target_date: date,
+    symbols: Set[str],
+    adjusted: bool,
+    limiter: RateLimiter | None = None,
+) -> List[Dict[str, object]]:
+    params = {"adjusted": "true" if adjusted else "false", "apiKey": api_key}
+    url = GROUPED_AGGS_URL.format(date=target_date.isoformat())
+    async with semaphore:
+        if limiter is not None:
+            await limiter.acquire()
+        async with session.get(url, params=params) as response:
+            response.raise_for_status()
+            payload = await response.json()
+
+    rows: List[Dict[str, object]] = []
+    append = rows.append
+    for aggregate in payload.get("results") or []:
+        symbol = aggregate.get("T")
+        if not symbol or symbol not in symbols:
+            continue
+        append(
+            {
+                "symbol": symbol,
+                "trade_date": target_date,
+                "open": aggregate.get("o"),
+                "high": aggregate.get("h"),
+                "low": aggregate.get("l"),
+                "close": aggregate.get("c"),
+                "volume": aggregate.get("v"),
+                "vwap": aggregate.get("vw"),
+                "transactions": aggregate.get("n"),
+            }
+        )
     return rows
 
 
-def main() -> None:
-    args = parse_args()
+async def fetch_grouped_price_rows_for_dates(
+    api_key: str,
+    dates: List[date],
+    symbols: Set[str],
+    adjusted: bool,
+    requests_per_second: float = 0.0,
+) -> List[List[Dict[str, object]]]:
+    """Fetch grouped daily aggregates for many dates over one pooled session."""
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limiter = RateLimiter(max(1, round(requests_per_second))) if requests_per_second > 0 else None
+    async with aiohttp.ClientSession() as session:
+        results = await asyncio.gather(
+            *(
+                afetch_grouped_price_rows(
+                    session, semaphore, api_key, target_date, symbols, adjusted, limiter
+                )
+                for target_date in dates
+            ),
+            return_exceptions=True,
+        )
+
+    per_date_rows: List[List[Dict[str, object]]] = []
+    for target_date, result in zip(dates, results):
+        if isinstance(result, BaseException):
+            LOGGER.error("Failed to fetch grouped aggregates for %s: %s", target_date, result)
+            per_date_rows.append([])
+        else:
+            per_date_rows.append(result)
+    return per_date_rows
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
     logging.basicConfig(level=getattr(logging, str(args.log_level).upper(), logging.INFO), format="%(levelname)s %(message)s")
 
     if not args.polygon_key:
@@ -225,8 +487,14 @@ def main() -> None:
 
     config = load_database_config_from_args(args)
     engine = create_engine_from_config(config)
-    prices_table = create_tables(engine)
-    symbols = fetch_symbols(engine)
+
+    # The prices DDL and the companies scan are independent; overlap their
+    # round trips on two pooled connections before any HTTP work starts.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        prices_future = executor.submit(create_tables, engine)
+        symbols_future = executor.submit(fetch_symbols, engine)
+        prices_table = prices_future.result()
+        symbols = symbols_future.result()
 
     if not symbols:
         LOGGER.warning("No symbols found in companies table.")
@@ -239,20 +507,41 @@ def main() -> None:
         "adjusted" if args.adjusted else "raw",
     )
 
-    client = RESTClient(args.polygon_key)
-
     symbol_set = set(symbols)
-    try:
-        rows = fetch_grouped_price_rows(
-            client=client,
-            target_date=_date,
-            symbols=symbol_set,
-            adjusted=args.adjusted,
+    start_date = args.start_date or _date
+    if start_date > _date:
+        raise ValueError("Start date cannot be after --date.")
+    dates = list(date_range(start_date, _date))
+
+    if len(dates) > 1:
+        per_date_rows = asyncio.run(
+            fetch_grouped_price_rows_for_dates(
+                api_key=args.polygon_key,
+                dates=dates,
+                symbols=symbol_set,
+                adjusted=args.adjusted,
+                requests_per_second=args.requests_per_second,
+            )
         )
-    except Exception as exc:
-        LOGGER.exception("Failed to fetch grouped aggregates for %s: %s", _date, exc)
-    inserted = upsert_prices(engine, prices_table, rows, args.chunk_size)
-    LOGGER.info("%s: stored %d rows", _date, inserted)
+    else:
+        client = RESTClient(args.polygon_key)
+        try:
+            per_date_rows = [
+                fetch_grouped_price_rows(
+                    client=client,
+                    target_date=_date,
+                    symbols=symbol_set,
+                    adjusted=args.adjusted,
+                )
+            ]
+        except Exception as exc:
+            LOGGER.exception("Failed to fetch grouped aggregates for %s: %s", _date, exc)
+            per_date_rows = [[]]
+
+    chunk_size = effective_chunk_size(engine, prices_table, args.chunk_size)
+    for target_date, rows in zip(dates, per_date_rows):
+        inserted = upsert_prices(engine, prices_table, rows, chunk_size)
+        LOGGER.info("%s: stored %d rows", target_date, inserted)
 
 if __name__ == "__main__":
     main()
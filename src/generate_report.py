@@ -3,14 +3,17 @@
 from __future__ import annotations
 
 import argparse
+import io
 import logging
 import os
 from datetime import date, datetime, timedelta
 from zoneinfo import ZoneInfo
 from pathlib import Path
+from typing import Sequence
 
+import numpy as np
 import pandas as pd
-from sqlalchemy import Table, text
+from sqlalchemy import Table, select, text
 from sqlalchemy.engine import Engine
 
 from db import (
@@ -23,7 +26,7 @@ from db import (
 LOGGER = logging.getLogger(__name__)
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
         "--report-date",
@@ -48,13 +51,19 @@ def parse_args() -> argparse.Namespace:
         default=10.0,
         help="Minimum percentage gain to list in top gainers (default: %(default)s)",
     )
+    parser.add_argument(
+        "--top-n",
+        type=int,
+        default=50,
+        help="Maximum rows to list per report section (default: %(default)s)",
+    )
     add_config_argument(parser)
     parser.add_argument(
         "--log-level",
         default=os.getenv("LOG_LEVEL", "INFO"),
         help="Logging level (default: %(default)s)",
     )
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 def _parse_date(value: str) -> date:
@@ -66,21 +75,44 @@ def load_tables(engine: Engine) -> tuple[Table, Table, Table]:
     return tables["prices"], tables["companies"], tables["sma_events"]
 
 
-def load_price_history(
+def load_enriched_prices(
     engine: Engine,
-    prices: Table,
     target_date: date,
     lookback_days: int,
+    volume_window: int,
 ) -> pd.DataFrame:
+    """Load target-date rows with prev-close and rolling volume computed in SQL.
+
+    The window functions run server-side so only one row per symbol crosses
+    the wire, instead of the whole lookback history.
+    """
+
     start_date = target_date - timedelta(days=lookback_days)
-    query = (
-        text(
-            """
-            SELECT symbol, trade_date, close, volume
+    # Frame bounds cannot be bound parameters in MySQL; volume_window comes
+    # from argparse as an int.
+    frame_bound = int(volume_window)
+    query = text(
+        f"""
+        SELECT symbol, trade_date, close, volume, prev_close, avg_volume_window
+        FROM (
+            SELECT
+                symbol,
+                trade_date,
+                close,
+                volume,
+                LAG(close) OVER w AS prev_close,
+                CASE
+                    WHEN COUNT(volume) OVER w_vol >= 5
+                    THEN AVG(volume) OVER w_vol
+                END AS avg_volume_window
             FROM prices
             WHERE trade_date BETWEEN :start_date AND :target_date
-            """
-        )
+            WINDOW w AS (PARTITION BY symbol ORDER BY trade_date),
+                   w_vol AS (PARTITION BY symbol ORDER BY trade_date
+                             ROWS BETWEEN {frame_bound} PRECEDING AND 1 PRECEDING)
+        ) windowed
+        WHERE trade_date = :target_date
+        """
     )
     frame = pd.read_sql(
         query,
@@ -90,21 +122,22 @@ def load_price_history(
     )
     if frame.empty:
         return frame
-    frame["trade_date"] = frame["trade_date"].dt.date
+    # Keep trade_date as datetime64; converting to Python date objects would
+    # force object dtype and per-element dispatch downstream.
+    frame["pct_change"] = (frame["close"] - frame["prev_close"]) / frame["prev_close"] * 100
     return frame
 
 
 def load_companies(engine: Engine, companies: Table) -> pd.DataFrame:
-    frame = pd.read_sql(companies.select(), engine)
-    frame = frame.rename(
-        columns={
-            "symbol": "symbol",
-            "company_name": "company_name",
-            "sector": "sector",
-            "industry": "industry",
-        }
+    # Only the columns the report consumes; skips market cap, share counts
+    # and anything else on the table.
+    query = select(
+        companies.c.symbol,
+        companies.c.company_name,
+        companies.c.sector,
+        companies.c.industry,
     )
-    return frame
+    return pd.read_sql(query, engine)
 
 
 def load_sma_events(engine: Engine, sma_events: Table, target_date: date) -> pd.DataFrame:
@@ -116,37 +149,10 @@ def load_sma_events(engine: Engine, sma_events: Table, target_date: date) -> pd.
     frame = pd.read_sql(query, engine)
     if frame.empty:
         return frame
-    frame["event_date"] = pd.to_datetime(frame["event_date"]).dt.date
+    frame["event_date"] = pd.to_datetime(frame["event_date"])
     return frame
 
 
-def enrich_price_metrics(
-    prices_df: pd.DataFrame,
-    target_date: date,
-    volume_window: int,
-) -> pd.DataFrame:
-    if prices_df.empty:
-        return prices_df
-
-    prices_df = prices_df.sort_values(["symbol", "trade_date"]).reset_index(drop=True)
-
-    prices_df["prev_close"] = (
-        prices_df.groupby("symbol")["close"].shift(1)
-    )
-    prices_df["pct_change"] = (
-        (prices_df["close"] - prices_df["prev_close"]) / prices_df["prev_close"] * 100
-    )
-
-    prices_df["avg_volume_window"] = (
-        prices_df.groupby("symbol")["volume"]
-        .apply(lambda s: s.shift(1).rolling(window=volume_window, min_periods=5).mean())
-        .reset_index(level=0, drop=True)
-    )
-
-    todays = prices_df[prices_df["trade_date"] == target_date].copy()
-    return todays
-
-
 def merge_company_details(
     todays_df: pd.DataFrame,
     companies_df: pd.DataFrame,
@@ -161,6 +167,20 @@ def merge_company_details(
     )
 
 
+def _fmt2(series: pd.Series) -> pd.Series:
+    # np.char.mod applies the fixed "%.2f" spec in one C pass over the column,
+    # instead of a Python-level format call per row.
+    formatted = np.char.mod("%.2f", series.to_numpy(dtype=np.float64))
+    return pd.Series(formatted, index=series.index)
+
+
+def _fmt2_opt(series: pd.Series) -> pd.Series:
+    # np.char.mod renders NaN as the literal "nan"; price-crossover events
+    # carry a NULL long_sma (or short_sma) before the window warms up, so
+    # mask those slots instead of printing "nan" in the report.
+    return _fmt2(series).mask(series.isna(), "N/A")
+
+
 def format_report(
     report_date: date,
     top_movers: pd.DataFrame,
@@ -170,104 +190,128 @@ def format_report(
     volume_spikes: pd.DataFrame,
     gain_threshold: float,
 ) -> str:
-    lines: list[str] = []
-    lines.append(f"Daily Market Report - {report_date.isoformat()}")
-    lines.append("=" * 60)
-    lines.append("")
+    buf = io.StringIO()
+
+    def emit(line: str) -> None:
+        buf.write(line)
+        buf.write("\n")
+
+    def emit_all(section_lines: pd.Series) -> None:
+        buf.write("\n".join(section_lines.tolist()))
+        buf.write("\n")
+
+    emit(f"Daily Market Report - {report_date.isoformat()}")
+    emit("=" * 60)
+    emit("")
 
-    lines.append(f"Stocks Up More Than {gain_threshold:.2f}%")
-    lines.append("-" * 60)
+    emit(f"Stocks Up More Than {gain_threshold:.2f}%")
+    emit("-" * 60)
     if top_movers.empty:
-        lines.append("No stocks gained above the configured threshold.")
+        emit("No stocks gained above the configured threshold.")
     else:
-        for _, row in top_movers.iterrows():
-            company = row.get("company_name") or "N/A"
-            sector = row.get("sector") or "N/A"
-            industry = row.get("industry") or "N/A"
-            pct_change = row["pct_change"]
-            close_price = row["close"]
-            prev_close = row["prev_close"]
-            lines.append(
-                f"- {row['symbol']}: {company} | {pct_change:.2f}% "
-                f"(Close: {close_price:.2f}, Prev Close: {prev_close:.2f}) "
-                f"[Sector: {sector} | Industry: {industry}]"
+        # Build each section's lines column-wise; string concatenation over
+        # Series avoids a Series allocation and f-string call per row.
+        emit_all(
+            (
+                "- " + top_movers["symbol"]
+                + ": " + top_movers["company_name"].fillna("N/A")
+                + " | " + _fmt2(top_movers["pct_change"])
+                + "% (Close: " + _fmt2(top_movers["close"])
+                + ", Prev Close: " + _fmt2(top_movers["prev_close"])
+                + ") [Sector: " + top_movers["sector"].fillna("N/A")
+                + " | Industry: " + top_movers["industry"].fillna("N/A")
+                + "]"
             )
-    lines.append("")
+        )
+    emit("")
 
-    lines.append("SMA Events")
-    lines.append("-" * 60)
+    emit("SMA Events")
+    emit("-" * 60)
     if sma_events.empty:
-        lines.append("No SMA events recorded for today.")
+        emit("No SMA events recorded for today.")
     else:
-        for _, row in sma_events.sort_values(["event_type", "symbol"]).iterrows():
-            short_window = row.get("short_window")
-            long_window = row.get("long_window")
-            close_price = row.get("close_price")
-            short_sma = row.get("short_sma")
-            long_sma = row.get("long_sma")
-            details = []
-            if close_price is not None:
-                details.append(f"Close {close_price:.2f}")
-            if short_sma is not None:
-                details.append(f"SMA{short_window} {short_sma:.2f}")
-            if long_sma is not None:
-                details.append(f"SMA{long_window} {long_sma:.2f}")
-            detail_text = "; ".join(details) if details else "No SMA details"
-            lines.append(
-                f"- {row['symbol']}: {row['event_type']} ({detail_text})"
+        ordered = sma_events.sort_values(["event_type", "symbol"])
+        emit_all(
+            (
+                "- " + ordered["symbol"]
+                + ": " + ordered["event_type"]
+                + " (Close " + _fmt2_opt(ordered["close_price"])
+                + "; SMA" + ordered["short_window"].astype(str)
+                + " " + _fmt2_opt(ordered["short_sma"])
+                + "; SMA" + ordered["long_window"].astype(str)
+                + " " + _fmt2_opt(ordered["long_sma"])
+                + ")"
             )
-    lines.append("")
+        )
+    emit("")
 
-    lines.append("Sector Leaders (Top Average % Gain)")
-    lines.append("-" * 60)
+    emit("Sector Leaders (Top Average % Gain)")
+    emit("-" * 60)
     if sector_leaders.empty:
-        lines.append("No sector performance data available.")
+        emit("No sector performance data available.")
     else:
-        for _, row in sector_leaders.iterrows():
-            lines.append(
-                f"- {row['sector']}: Avg Change {row['avg_pct_change']:.2f}% "
-                f"(Top: {row['top_symbol']} {row['top_pct_change']:.2f}% - {row['top_company']})"
+        emit_all(
+            (
+                "- " + sector_leaders["sector"].astype(str)
+                + ": Avg Change " + _fmt2(sector_leaders["avg_pct_change"])
+                + "% (Top: " + sector_leaders["top_symbol"]
+                + " " + _fmt2(sector_leaders["top_pct_change"])
+                + "% - " + sector_leaders["top_company"].astype(str)
+                + ")"
             )
-    lines.append("")
+        )
+    emit("")
 
-    lines.append("Industry Leaders (Top Average % Gain)")
-    lines.append("-" * 60)
+    emit("Industry Leaders (Top Average % Gain)")
+    emit("-" * 60)
     if industry_leaders.empty:
-        lines.append("No industry performance data available.")
+        emit("No industry performance data available.")
     else:
-        for _, row in industry_leaders.iterrows():
-            lines.append(
-                f"- {row['industry']}: Avg Change {row['avg_pct_change']:.2f}% "
-                f"(Top: {row['top_symbol']} {row['top_pct_change']:.2f}% - {row['top_company']})"
+        emit_all(
+            (
+                "- " + industry_leaders["industry"].astype(str)
+                + ": Avg Change " + _fmt2(industry_leaders["avg_pct_change"])
+                + "% (Top: " + industry_leaders["top_symbol"]
+                + " " + _fmt2(industry_leaders["top_pct_change"])
+                + "% - " + industry_leaders["top_company"].astype(str)
+                + ")"
             )
-    lines.append("")
+        )
+    emit("")
 
-    lines.append("Unusual Volume (>= 3x rolling average)")
-    lines.append("-" * 60)
+    emit("Unusual Volume (>= 3x rolling average)")
+    emit("-" * 60)
     if volume_spikes.empty:
-        lines.append("No volume spikes detected.")
+        emit("No volume spikes detected.")
     else:
-        for _, row in volume_spikes.iterrows():
-            ratio = row["volume"] / row["avg_volume_window"] if row["avg_volume_window"] else float("inf")
-            lines.append(
-                f"- {row['symbol']}: Volume {row['volume']:,} (~{ratio:.2f}x avg {row['avg_volume_window']:.0f}) "
-                f"| Change {row['pct_change']:.2f}%"
+        # compute_volume_spikes guarantees avg_volume_window > 0.
+        ratio = volume_spikes["volume"] / volume_spikes["avg_volume_window"]
+        emit_all(
+            (
+                "- " + volume_spikes["symbol"]
+                + ": Volume " + volume_spikes["volume"].map("{:,}".format)
+                + " (~" + _fmt2(ratio)
+                + "x avg " + volume_spikes["avg_volume_window"].map("{:.0f}".format)
+                + ") | Change " + _fmt2(volume_spikes["pct_change"])
+                + "%"
             )
+        )
 
-    lines.append("")
-    lines.append("End of report.")
+    emit("")
+    emit("End of report.")
 
-    return "\n".join(lines)
+    return buf.getvalue().rstrip("\n")
 
 
-def compute_top_gainers(enriched: pd.DataFrame, threshold: float) -> pd.DataFrame:
+def compute_top_gainers(enriched: pd.DataFrame, threshold: float, top_n: int = 50) -> pd.DataFrame:
     if enriched.empty:
         return enriched
     filtered = enriched[
         enriched["pct_change"].notna()
         & (enriched["pct_change"] >= threshold)
     ]
-    return filtered.sort_values("pct_change", ascending=False)
+    # Partial selection: O(N log k) instead of fully sorting the frame.
+    return filtered.nlargest(top_n, "pct_change")
 
 
 def compute_group_leaders(
@@ -282,34 +326,30 @@ def compute_group_leaders(
     if valid.empty:
         return pd.DataFrame(columns=[group_col, "avg_pct_change", "top_symbol", "top_pct_change", "top_company"])
 
-    group_stats = (
-        valid.groupby(group_col)
-        .agg(
-            avg_pct_change=("pct_change", "mean"),
-        )
-        .reset_index()
-    )
-
-    top_per_group = (
-        valid.sort_values("pct_change", ascending=False)
-        .drop_duplicates(subset=[group_col])
+    # One groupby pass: the mean per group plus idxmax to locate each group's
+    # top row, instead of a full sort + drop_duplicates + merge.
+    # sort=False skips the group-key sort; the result is re-ordered by
+    # avg_pct_change below anyway.
+    grouped = valid.groupby(group_col, sort=False)["pct_change"]
+    top_rows = (
+        valid.loc[grouped.idxmax(), [group_col, "symbol", "pct_change", "company_name"]]
         .rename(
             columns={
                 "symbol": "top_symbol",
                 "pct_change": "top_pct_change",
                 "company_name": "top_company",
             }
-        )[[group_col, "top_symbol", "top_pct_change", "top_company"]]
+        )
+        .set_index(group_col)
     )
-
-    merged = group_stats.merge(top_per_group, on=group_col, how="inner")
-    merged = merged.sort_values("avg_pct_change", ascending=False)
-    return merged
+    merged = grouped.mean().to_frame("avg_pct_change").join(top_rows).reset_index()
+    return merged.sort_values("avg_pct_change", ascending=False)
 
 
 def compute_volume_spikes(
     enriched: pd.DataFrame,
     multiplier: float = 3.0,
+    top_n: int = 50,
 ) -> pd.DataFrame:
     if enriched.empty:
         return enriched
@@ -318,7 +358,7 @@ def compute_volume_spikes(
         & (enriched["avg_volume_window"] > 0)
         & (enriched["volume"] >= enriched["avg_volume_window"] * multiplier)
     ].copy()
-    return filtered.sort_values("volume", ascending=False)
+    return filtered.nlargest(top_n, "volume")
 
 
 def ensure_output_dir(path: Path) -> None:
@@ -334,8 +374,8 @@ def write_report(content: str, output_dir: Path, report_date: date) -> Path:
     return report_path
 
 
-def main() -> None:
-    args = parse_args()
+def main(argv: Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
     logging.basicConfig(level=getattr(logging, str(args.log_level).upper(), logging.INFO), format="%(levelname)s %(message)s")
 
     today = datetime.now(ZoneInfo("America/Los_Angeles")).date()
@@ -350,21 +390,21 @@ def main() -> None:
         raise
 
     lookback_days = max(args.volume_window * 2, 90)
-    prices_df = load_price_history(engine, prices_table, report_date, lookback_days)
+    enriched_today = load_enriched_prices(
+        engine,
+        report_date,
+        lookback_days=lookback_days,
+        volume_window=args.volume_window,
+    )
     companies_df = load_companies(engine, companies_table)
     sma_events_df = load_sma_events(engine, sma_events_table, report_date)
 
-    enriched_today = enrich_price_metrics(
-        prices_df,
-        target_date=report_date,
-        volume_window=args.volume_window,
-    )
     enriched_today = merge_company_details(enriched_today, companies_df)
 
-    top_movers = compute_top_gainers(enriched_today, args.gain_threshold)
+    top_movers = compute_top_gainers(enriched_today, args.gain_threshold, top_n=args.top_n)
     sector_leaders = compute_group_leaders(enriched_today, "sector")
     industry_leaders = compute_group_leaders(enriched_today, "industry")
-    volume_spikes = compute_volume_spikes(enriched_today)
+    volume_spikes = compute_volume_spikes(enriched_today, top_n=args.top_n)
 
     report_content = format_report(
         report_date=report_date,
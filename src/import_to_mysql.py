@@ -5,16 +5,21 @@ from __future__ import annotations
 import argparse
 import glob
 import logging
-import math
 import os
 import re
+import threading
 import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Iterable, Iterator, List, Optional
+from typing import Dict, List, Optional
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 from polygon import RESTClient
-from sqlalchemy import BigInteger, Column, MetaData, String, Table, inspect, text
+from sqlalchemy import BigInteger, Column, MetaData, String, Table, inspect, select, text
 from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.engine import Engine
 
@@ -94,40 +99,57 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def read_csv_as_strings(path: str) -> pd.DataFrame:
+    """Parse one CSV with Arrow's multithreaded reader, all columns as strings."""
+
+    table = pacsv.read_csv(path, parse_options=pacsv.ParseOptions(delimiter=";"))
+    table = table.cast(pa.schema([pa.field(name, pa.string()) for name in table.column_names]))
+    return table.to_pandas()
+
+
+def _read_and_normalize(path: str) -> Optional[pd.DataFrame]:
+    LOGGER.info("Reading %s", path)
+    df = read_csv_as_strings(path)
+    normalized_df = normalize_columns(df)
+
+    if "symbol" not in normalized_df.columns:
+        LOGGER.warning("Skipping %s because symbol column is missing", path)
+        return None
+
+    missing_columns = [col for col in TARGET_COLUMNS if col not in normalized_df.columns]
+    if missing_columns:
+        LOGGER.warning(
+            "File %s is missing columns %s; filling them with 0 values",
+            path,
+            ", ".join(missing_columns),
+        )
+
+    return normalized_df.reindex(columns=TARGET_COLUMNS)
+
+
 def load_data_frames(data_dir: str) -> pd.DataFrame:
     pattern = os.path.join(data_dir, "*.csv")
-    frames: List[pd.DataFrame] = []
-    for path in glob.glob(pattern):
-        LOGGER.info("Reading %s", path)
-        df = pd.read_csv(path, dtype=str, delimiter=";")
-        normalized_df = normalize_columns(df)
-
-        if "symbol" not in normalized_df.columns:
-            LOGGER.warning("Skipping %s because symbol column is missing", path)
-            continue
-
-        missing_columns = [col for col in TARGET_COLUMNS if col not in normalized_df.columns]
-        if missing_columns:
-            LOGGER.warning(
-                "File %s is missing columns %s; filling them with 0 values",
-                path,
-                ", ".join(missing_columns),
-            )
-
-        frames.append(normalized_df.reindex(columns=TARGET_COLUMNS))
+    paths = glob.glob(pattern)
+    # read_csv releases the GIL for most of the parse, so files load
+    # concurrently on threads.
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+        frames = [frame for frame in executor.map(_read_and_normalize, paths) if frame is not None]
 
     if not frames:
         raise RuntimeError(f"No usable Excel files found in {data_dir}")
 
     combined = pd.concat(frames, ignore_index=True)
     combined = combined.dropna(subset=["symbol"])
-    combined["symbol"] = combined["symbol"].str.strip().str.upper()
-    combined["company_name"] = combined["company_name"].str.strip()
-    combined["sector"] = combined["sector"].str.strip()
-    combined["industry"] = combined["industry"].str.strip()
+    # Trim (and upper-case for symbol) through Arrow's vectorized UTF-8
+    # kernels rather than chained pandas .str passes per column.
+    for column in ("symbol", "company_name", "sector", "industry"):
+        array = pc.utf8_trim_whitespace(pa.array(combined[column], type=pa.string()))
+        if column == "symbol":
+            array = pc.utf8_upper(array)
+        combined[column] = array.to_pandas()
 
     if "market_cap" in combined.columns:
-        combined["market_cap"] = combined["market_cap"].map(parse_market_cap)
+        combined["market_cap"] = parse_market_cap_series(combined["market_cap"])
 
     combined["weighted_shares_outstanding"] = 0
 
@@ -136,45 +158,52 @@ def load_data_frames(data_dir: str) -> pd.DataFrame:
     return combined
 
 def load_existing_companies(engine: Engine, companies: Table) -> pd.DataFrame:
-    frame = pd.read_sql(companies.select(), engine)
-    frame = frame.rename(
-        columns={
-            "symbol": "symbol",
-            "company_name": "company_name",
-            "sector": "sector",
-            "industry": "industry",
-            "market_cap": "market_cap"
-        }
+    query = select(
+        companies.c.symbol,
+        companies.c.company_name,
+        companies.c.sector,
+        companies.c.industry,
+        companies.c.market_cap,
     )
+    frame = pd.read_sql(query, engine)
     frame["weighted_shares_outstanding"] = 0
     return frame
 
-def normalize_columns(frame: pd.DataFrame) -> pd.DataFrame:
+# Normalized alias lookup computed once at module load.
+_ALIAS_LOOKUP = {key.strip().lower(): value for key, value in COLUMN_ALIASES.items()}
+
+
+@lru_cache(maxsize=64)
+def _rename_map_for(columns: tuple) -> Dict[str, str]:
+    """Resolve a header tuple to its rename map; headers repeat across files."""
+
     rename_map: Dict[str, str] = {}
-    for column in frame.columns:
-        alias = COLUMN_ALIASES.get(column.strip().lower())
+    for column in columns:
+        alias = _ALIAS_LOOKUP.get(column.strip().lower())
         if alias:
             rename_map[column] = alias
-    normalized = frame.rename(columns=rename_map)
-    return normalized
+    return rename_map
 
 
-def parse_market_cap(raw_value: object) -> int | None:
-    if raw_value is None or (isinstance(raw_value, float) and pd.isna(raw_value)):
-        return 0
+def normalize_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    rename_map = _rename_map_for(tuple(frame.columns))
+    if not rename_map:
+        return frame
+    return frame.rename(columns=rename_map)
 
-    value = str(raw_value).strip()
-    if not value or value.lower() in {"n/a", "na", "none"}:
-        return 0
 
-    number_part, suffix = value[1:-1], value[-1]
-    number = float(number_part.replace(",", ""))
-    if math.isnan(number):
-        LOGGER.info("Invalid number: %s" % raw_value)
-        return 0
+def parse_market_cap_series(series: pd.Series) -> pd.Series:
+    """Parse a market-cap column (e.g. ``$1.5B``) in one vectorized pass.
 
-    multiplier = MARKET_CAP_MULTIPLIERS.get(suffix.upper(), 1)
-    return int(number * multiplier)
+    Invalid or missing values become 0, matching the old per-row parser.
+    """
+
+    values = series.astype("string").str.strip()
+    extracted = values.str.extract(r"^\$?([0-9.,]+)\s*([KMBT]?)$", flags=re.IGNORECASE)
+    numbers = pd.to_numeric(extracted[0].str.replace(",", "", regex=False), errors="coerce")
+    multipliers = extracted[1].str.upper().map(MARKET_CAP_MULTIPLIERS).fillna(1)
+    parsed = (numbers * multipliers).where(numbers.notna(), 0)
+    return parsed.astype("int64")
 
 
 def create_table(engine: Engine) -> Table:
@@ -209,26 +238,30 @@ def ensure_weighted_shares_column(engine: Engine, table: Table) -> None:
             )
 
 
-def chunked(iterable: Iterable[Dict[str, object]], size: int) -> Iterator[List[Dict[str, object]]]:
-    chunk: List[Dict[str, object]] = []
-    for item in iterable:
-        chunk.append(item)
-        if len(chunk) >= size:
-            yield chunk
-            chunk = []
-    if chunk:
-        yield chunk
-
-
 def upsert_dataframe(engine: Engine, table: Table, data: pd.DataFrame, chunk_size: int) -> None:
-    records = data.to_dict(orient="records")
     updatable_columns = [col for col in TARGET_COLUMNS if col != "symbol"]
 
+    # Build and compile the upsert once; each batch then goes through the
+    # driver's executemany instead of re-rendering the statement per batch.
+    stmt = mysql_insert(table)
+    update_mapping = {column: stmt.inserted[column] for column in updatable_columns}
+    stmt = stmt.on_duplicate_key_update(**update_mapping)
+
+    # Stay columnar until dispatch: slice the column lists per batch and only
+    # materialize dicts for the rows in flight, instead of converting the
+    # whole frame with to_dict(orient="records") up front. tolist() yields
+    # native Python scalars; numpy scalars (np.int64 for market_cap etc.)
+    # miss mysqlclient's exact-type converter lookup.
+    columns = list(data.columns)
+    column_values = [data[column].tolist() for column in columns]
+
     with engine.begin() as connection:
-        for batch in chunked(records, chunk_size):
-            stmt = mysql_insert(table).values(batch)
-            update_mapping = {column: stmt.inserted[column] for column in updatable_columns}
-            connection.execute(stmt.on_duplicate_key_update(**update_mapping))
+        for start in range(0, len(data), chunk_size):
+            batch = [
+                dict(zip(columns, row))
+                for row in zip(*(values[start:start + chunk_size] for values in column_values))
+            ]
+            connection.execute(stmt, batch)
             LOGGER.debug("Upserted %d rows", len(batch))
 
 
@@ -246,10 +279,28 @@ def safe_to_int(value: Optional[object]) -> Optional[int]:
     return int(as_float)
 
 
+class RequestRateLimiter:
+    """Thread-safe pacer that spaces calls by a fixed minimum interval."""
+
+    def __init__(self, max_calls_per_second: float) -> None:
+        self._interval = 1.0 / max_calls_per_second
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            time.sleep(wait)
+
+
 def enrich_with_polygon_metrics(
     data: pd.DataFrame,
     api_key: str,
     sleep: float,
+    max_workers: int = 8,
 ) -> pd.DataFrame:
     if data.empty:
         return data
@@ -259,35 +310,55 @@ def enrich_with_polygon_metrics(
     if not symbols:
         return data
 
-    enriched = data.copy()
-    for index, symbol in enumerate(symbols, start=1):
-        try:
-            details = client.get_ticker_details(symbol)
-        except Exception as exc:
-            LOGGER.warning("Polygon request failed for %s: %s", symbol, exc)
-            continue
-        if not details:
-            LOGGER.debug("No ticker details returned for %s", symbol)
-            continue
-        
-        LOGGER.info("Get Polygon result for ticker %s", symbol)
-
-        market_cap = safe_to_int(getattr(details, "market_cap", None))
-        weighted_shares = safe_to_int(getattr(details, "weighted_shares_outstanding", None))
-
-        mask = enriched["symbol"] == symbol
-        if market_cap is not None:
-            enriched.loc[mask, "market_cap"] = market_cap
-        if weighted_shares is not None:
-            enriched.loc[mask, "weighted_shares_outstanding"] = weighted_shares
-
-        if sleep:
-            time.sleep(sleep)
-
-        if index % 50 == 0:
-            LOGGER.info("Refreshed Polygon metrics for %d/%d symbols.", index, len(symbols))
-
-    return enriched
+    # Fan requests out across worker threads; the limiter keeps the overall
+    # rate at the same requests-per-second the sequential sleep loop allowed.
+    limiter = RequestRateLimiter(1.0 / sleep if sleep else 50.0)
+
+    def fetch(symbol: str):
+        limiter.acquire()
+        return client.get_ticker_details(symbol)
+
+    updates: Dict[str, tuple] = {}
+    completed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, symbol): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                details = future.result()
+            except Exception as exc:
+                LOGGER.warning("Polygon request failed for %s: %s", symbol, exc)
+                continue
+            if not details:
+                LOGGER.debug("No ticker details returned for %s", symbol)
+                continue
+
+            LOGGER.info("Get Polygon result for ticker %s", symbol)
+
+            updates[symbol] = (
+                safe_to_int(getattr(details, "market_cap", None)),
+                safe_to_int(getattr(details, "weighted_shares_outstanding", None)),
+            )
+
+            completed += 1
+            if completed % 50 == 0:
+                LOGGER.info("Refreshed Polygon metrics for %d/%d symbols.", completed, len(symbols))
+
+    if not updates:
+        return data
+
+    # Apply all fetched metrics in one indexed update; DataFrame.update skips
+    # NaN entries, so missing values leave existing data untouched. This
+    # replaces a full-column equality scan per symbol.
+    updates_df = pd.DataFrame.from_dict(
+        updates, orient="index", columns=["market_cap", "weighted_shares_outstanding"]
+    )
+    updates_df.index.name = "symbol"
+    # set_index already yields a new frame; the caller rebinds the result and
+    # never touches the original, so no defensive copy is needed.
+    enriched = data.set_index("symbol")
+    enriched.update(updates_df)
+    return enriched.reset_index()
 
 
 def main() -> None:
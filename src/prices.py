@@ -3,37 +3,62 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import logging
 import os
 import time
-from datetime import date, datetime, timedelta
-from typing import Dict, Iterable, Iterator, List
+from collections import deque
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from massive import RESTClient
-from massive.rest import models as massive_models
+import aiohttp
 from sqlalchemy import (
     BigInteger,
     Column,
     Date,
     Float,
+    Index,
     MetaData,
     String,
     Table,
     func,
     select,
+    text,
 )
 from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncConnection
 
 from db import (
+    DatabaseConfig,
     add_config_argument,
+    create_async_engine_from_config,
     create_engine_from_config,
+    ensure_index,
     load_database_config_from_args,
     reflect_table,
 )
 
 LOGGER = logging.getLogger(__name__)
 
+AGGS_URL = (
+    "https://api.polygon.io/v2/aggs/ticker/{symbol}/range/"
+    "{multiplier}/{timespan}/{start}/{end}"
+)
+GROUPED_AGGS_URL = "https://api.polygon.io/v2/aggs/grouped/locale/us/market/stocks/{date}"
+
+# Per-symbol aggregate calls are independent, so a generous in-flight cap is
+# safe; the rate limiter below is what actually paces requests.
+MAX_CONCURRENT_REQUESTS = 64
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_MS_PER_DAY = 86_400_000
+
+# How many completed fetches the writer folds into one transaction before
+# committing; bounds both commit frequency and transaction size.
+COMMIT_EVERY_BATCHES = 50
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
@@ -81,14 +106,14 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--chunk-size",
         type=int,
-        default=500,
-        help="Rows to upsert per batch (default: %(default)s)",
+        default=5000,
+        help="Upper bound on rows per upsert batch; clamped to server limits (default: %(default)s)",
     )
     parser.add_argument(
-        "--sleep",
+        "--requests-per-second",
         type=float,
-        default=0.25,
-        help="Seconds to sleep between API calls (default: %(default)s)",
+        default=4.0,
+        help="Maximum API requests per second; 0 disables throttling (default: %(default)s)",
     )
     parser.add_argument(
         "--adjusted",
@@ -129,79 +154,147 @@ def create_tables(engine: Engine) -> Table:
         Column("volume", BigInteger),
         Column("vwap", Float),
         Column("transactions", BigInteger),
+        # Covering index for date-windowed report scans (reports filter on
+        # trade_date and read symbol/close), complementing the
+        # (symbol, trade_date) primary key.
+        Index("idx_prices_tradedate_symbol_close", "trade_date", "symbol", "close"),
         mysql_charset="utf8mb4",
         mysql_collate="utf8mb4_unicode_ci",
     )
 
     metadata.create_all(engine, checkfirst=True)
+    # create_all skips tables that already exist, so bring live schemas up
+    # to date explicitly.
+    ensure_index(
+        engine,
+        "prices",
+        "idx_prices_tradedate_symbol_close",
+        ("trade_date", "symbol", "close"),
+    )
     return prices
 
 
-def fetch_symbols(engine: Engine) -> List[str]:
+def fetch_symbols_with_latest(engine: Engine, prices: Table) -> List[Tuple[str, Optional[date]]]:
+    """Return every company symbol with its latest stored trade date, if any.
+
+    One LEFT JOIN replaces the separate symbol scan and per-symbol MAX()
+    lookup; symbols with no price rows come back with a NULL date.
+    """
+
     companies = reflect_table(engine, "companies")
+    query = (
+        select(companies.c.symbol, func.max(prices.c.trade_date).label("latest_date"))
+        .select_from(companies.outerjoin(prices, prices.c.symbol == companies.c.symbol))
+        .group_by(companies.c.symbol)
+    )
     with engine.connect() as connection:
-        result = connection.execute(select(companies.c.symbol))
-        symbols = [row[0] for row in result if row[0]]
-    return symbols
+        # Stream the grouped result instead of buffering every (symbol, date)
+        # pair client-side before the loop starts.
+        result = connection.execution_options(stream_results=True, yield_per=10_000).execute(query)
+        return [(row.symbol, row.latest_date) for row in result if row.symbol]
 
 
-def fetch_latest_trade_dates(engine: Engine, prices: Table) -> Dict[str, date]:
-    latest: Dict[str, date] = {}
-    with engine.connect() as connection:
-        result = connection.execute(
-            select(prices.c.symbol, func.max(prices.c.trade_date).label("latest_date")).group_by(prices.c.symbol)
-        )
-        for row in result:
-            latest[row.symbol] = row.latest_date
-    return latest
+def effective_chunk_size(engine: Engine, table: Table, requested: int) -> int:
+    """Clamp the upsert batch size to MySQL's placeholder and packet limits.
+
+    The requested size acts as an upper bound; the server's
+    max_allowed_packet and the 65535-placeholder ceiling cap it so a batch
+    can never overflow either limit regardless of column count.
+    """
 
+    with engine.connect() as connection:
+        row = connection.execute(text("SHOW VARIABLES LIKE 'max_allowed_packet'")).fetchone()
+    max_packet = int(row[1]) if row else 4 * 1024 * 1024
+    column_count = len(table.columns)
+    # Rough upper estimate of the wire size of one bound row.
+    estimated_row_bytes = 64 * column_count
+    limit = min(65_535 // column_count, max_packet // estimated_row_bytes)
+    return max(1, min(requested, limit))
+
+
+# Bounded: each main() run builds a fresh MetaData/Table, so an unbounded
+# cache would pin one graph per run for the life of a long-running process
+# (the webapp invokes these mains in-process per job).
+@lru_cache(maxsize=8)
+def _upsert_stmt(table: Table):
+    """Build the ON DUPLICATE KEY UPDATE statement once per table."""
+
+    stmt = mysql_insert(table)
+    update_columns = {
+        column.name: getattr(stmt.inserted, column.name)
+        for column in table.columns
+        if not column.primary_key
+    }
+    return stmt.on_duplicate_key_update(**update_columns)
 
-def chunked(iterable: Iterable[Dict[str, object]], size: int) -> Iterator[List[Dict[str, object]]]:
-    chunk: List[Dict[str, object]] = []
-    for item in iterable:
-        chunk.append(item)
-        if len(chunk) >= size:
-            yield chunk
-            chunk = []
-    if chunk:
-        yield chunk
 
+async def upsert_prices(
+    connection: AsyncConnection, table: Table, rows: List[Dict[str, object]], chunk_size: int
+) -> int:
+    """Upsert rows on an already-checked-out connection; the caller commits."""
 
-def upsert_prices(engine: Engine, table: Table, rows: List[Dict[str, object]], chunk_size: int) -> int:
     if not rows:
         return 0
 
+    # The prepared upsert is cached across calls, so each slice of rows rides
+    # the driver's executemany path with no per-call statement construction.
+    stmt = _upsert_stmt(table)
+
     inserted = 0
-    with engine.begin() as connection:
-        for batch in chunked(rows, chunk_size):
-            stmt = mysql_insert(table).values(batch)
-            update_columns = {
-                column.name: getattr(stmt.inserted, column.name)
-                for column in table.columns
-                if not column.primary_key
-            }
-            connection.execute(stmt.on_duplicate_key_update(**update_columns))
-            inserted += len(batch)
+    for start in range(0, len(rows), chunk_size):
+        batch = rows[start:start + chunk_size]
+        await connection.execute(stmt, batch)
+        inserted += len(batch)
     return inserted
 
 
-def to_price_row(symbol: str, aggregate: massive_models.Agg) -> Dict[str, object]:
-    trade_dt = datetime.utcfromtimestamp(aggregate.timestamp / 1000).date()
+def to_price_row(symbol: str, aggregate: Dict[str, object]) -> Dict[str, object]:
+    # Pure integer arithmetic: avoids building a datetime (and the deprecated
+    # utcfromtimestamp call) for every aggregate in the ingest loop.
+    trade_dt = date.fromordinal(_EPOCH_ORDINAL + aggregate["t"] // _MS_PER_DAY)
     return {
         "symbol": symbol,
         "trade_date": trade_dt,
-        "open": aggregate.open,
-        "high": aggregate.high,
-        "low": aggregate.low,
-        "close": aggregate.close,
-        "volume": aggregate.volume,
-        "vwap": getattr(aggregate, "vwap", None),
-        "transactions": getattr(aggregate, "transactions", None),
+        "open": aggregate.get("o"),
+        "high": aggregate.get("h"),
+        "low": aggregate.get("l"),
+        "close": aggregate.get("c"),
+        "volume": aggregate.get("v"),
+        "vwap": aggregate.get("vw"),
+        "transactions": aggregate.get("n"),
     }
 
 
-def fetch_price_rows(
-    client: RESTClient,
+class RateLimiter:
+    """Sliding-window limiter: at most ``max_calls`` requests per ``window`` seconds.
+
+    Requests proceed immediately while the quota allows; only when the window
+    is full does a caller wait, and only for the remainder of the window.
+    """
+
+    def __init__(self, max_calls: int, window: float = 1.0) -> None:
+        self.max_calls = max_calls
+        self.window = window
+        self._calls: deque[float] = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            while self._calls and now - self._calls[0] >= self.window:
+                self._calls.popleft()
+            if len(self._calls) >= self.max_calls:
+                await asyncio.sleep(self.window - (now - self._calls[0]))
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.window:
+                    self._calls.popleft()
+            self._calls.append(now)
+
+
+async def afetch_price_rows(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    api_key: str,
     symbol: str,
     multiplier: int,
     timespan: str,
@@ -209,20 +302,258 @@ def fetch_price_rows(
     end_date: date,
     limit: int,
     adjusted: bool,
+    limiter: Optional[RateLimiter] = None,
 ) -> List[Dict[str, object]]:
-    aggregates: List[Dict[str, object]] = []
-    for agg in client.list_aggs(
-        ticker=symbol,
+    """Fetch one symbol's aggregates, following Polygon's next_url pagination."""
+
+    url: Optional[str] = AGGS_URL.format(
+        symbol=symbol,
         multiplier=multiplier,
         timespan=timespan,
-        from_=start_date.isoformat(),
-        to=end_date.isoformat(),
-        adjusted=adjusted,
-        sort="asc",
-        limit=limit,
-    ):
-        aggregates.append(to_price_row(symbol, agg))
-    return aggregates
+        start=start_date.isoformat(),
+        end=end_date.isoformat(),
+    )
+    params = {
+        "adjusted": "true" if adjusted else "false",
+        "sort": "asc",
+        "limit": limit,
+        "apiKey": api_key,
+    }
+    rows: List[Dict[str, object]] = []
+    while url:
+        async with semaphore:
+            if limiter is not None:
+                await limiter.acquire()
+            async with session.get(url, params=params) as response:
+                response.raise_for_status()
+                payload = await response.json()
+        for aggregate in payload.get("results") or []:
+            rows.append(to_price_row(symbol, aggregate))
+        # next_url carries the cursor; only the API key needs re-appending.
+        url = payload.get("next_url")
+        params = {"apiKey": api_key}
+    return rows
+
+
+async def fetch_and_store_prices(
+    db_config: DatabaseConfig,
+    prices_table: Table,
+    work: List[Tuple[str, date]],
+    end_date: date,
+    args: argparse.Namespace,
+) -> int:
+    """Fetch all pending symbols concurrently and upsert as each completes.
+
+    Completed row batches flow through a queue to a single writer coroutine.
+    Upserts go through an aiomysql engine, so HTTP fetches and MySQL writes
+    interleave on one event loop without thread hand-offs.
+    """
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limiter = (
+        RateLimiter(max(1, round(args.requests_per_second)))
+        if args.requests_per_second > 0
+        else None
+    )
+    db_engine = create_async_engine_from_config(db_config)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_CONCURRENT_REQUESTS)
+
+    async def writer() -> int:
+        # One pooled connection for the whole run; commit every K symbols
+        # instead of paying checkout + BEGIN/COMMIT per upsert call.
+        stored = 0
+        pending = 0
+        async with db_engine.connect() as connection:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    await connection.commit()
+                    return stored
+                symbol, start_date, rows = item
+                inserted = await upsert_prices(connection, prices_table, rows, args.chunk_size)
+                stored += inserted
+                pending += 1
+                if pending >= COMMIT_EVERY_BATCHES:
+                    await connection.commit()
+                    pending = 0
+                LOGGER.info("%s: stored %d rows (from %s to %s)", symbol, inserted, start_date, end_date)
+
+    async def fetch_one(session: aiohttp.ClientSession, symbol: str, start_date: date) -> None:
+        try:
+            rows = await afetch_price_rows(
+                session=session,
+                semaphore=semaphore,
+                api_key=args.polygon_key,
+                symbol=symbol,
+                multiplier=args.multiplier,
+                timespan=args.timespan,
+                start_date=start_date,
+                end_date=end_date,
+                limit=args.limit,
+                adjusted=args.adjusted,
+                limiter=limiter,
+            )
+        except Exception as exc:
+            LOGGER.exception("Failed to fetch data for %s: %s", symbol, exc)
+            return
+        await queue.put((symbol, start_date, rows))
+
+    try:
+        connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENT_REQUESTS)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            writer_task = asyncio.create_task(writer())
+            producers = asyncio.gather(
+                *(fetch_one(session, symbol, start_date) for symbol, start_date in work)
+            )
+            # Race the producers against the writer: if the writer dies on a
+            # MySQL error it stops draining the bounded queue, and producers
+            # would block forever in queue.put. Surfacing the writer's
+            # exception aborts the run instead of hanging it.
+            await asyncio.wait({producers, writer_task}, return_when=asyncio.FIRST_COMPLETED)
+            if writer_task.done():
+                producers.cancel()
+                try:
+                    await producers
+                except asyncio.CancelledError:
+                    pass
+                return await writer_task
+            await producers
+            await queue.put(None)
+            return await writer_task
+    finally:
+        await db_engine.dispose()
+
+
+def business_days(start: date, end: date) -> Iterator[date]:
+    current = start
+    one_day = timedelta(days=1)
+    while current <= end:
+        if current.weekday() < 5:
+            yield current
+        current += one_day
+
+
+async def afetch_grouped_rows(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    api_key: str,
+    target_date: date,
+    start_dates: Dict[str, date],
+    adjusted: bool,
+    limiter: Optional[RateLimiter] = None,
+) -> List[Dict[str, object]]:
+    """Fetch one trading day's aggregates for every ticker in a single call."""
+
+    params = {"adjusted": "true" if adjusted else "false", "apiKey": api_key}
+    url = GROUPED_AGGS_URL.format(date=target_date.isoformat())
+    async with semaphore:
+        if limiter is not None:
+            await limiter.acquire()
+        async with session.get(url, params=params) as response:
+            response.raise_for_status()
+            payload = await response.json()
+
+    rows: List[Dict[str, object]] = []
+    for aggregate in payload.get("results") or []:
+        symbol = aggregate.get("T")
+        start = start_dates.get(symbol)
+        if start is None or target_date < start:
+            continue
+        rows.append(
+            {
+                "symbol": symbol,
+                "trade_date": target_date,
+                "open": aggregate.get("o"),
+                "high": aggregate.get("h"),
+                "low": aggregate.get("l"),
+                "close": aggregate.get("c"),
+                "volume": aggregate.get("v"),
+                "vwap": aggregate.get("vw"),
+                "transactions": aggregate.get("n"),
+            }
+        )
+    return rows
+
+
+async def fetch_and_store_grouped(
+    db_config: DatabaseConfig,
+    prices_table: Table,
+    start_dates: Dict[str, date],
+    dates: List[date],
+    args: argparse.Namespace,
+) -> int:
+    """Backfill via the grouped-daily endpoint: one request per trading day.
+
+    For the default daily timespan this replaces O(symbols x days) per-symbol
+    calls with O(days) calls; per-symbol start dates still gate which rows
+    are kept from each day's payload.
+    """
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limiter = (
+        RateLimiter(max(1, round(args.requests_per_second)))
+        if args.requests_per_second > 0
+        else None
+    )
+    db_engine = create_async_engine_from_config(db_config)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_CONCURRENT_REQUESTS)
+
+    async def writer() -> int:
+        # One pooled connection for the whole run; commit every K trading
+        # days instead of paying checkout + BEGIN/COMMIT per upsert call.
+        stored = 0
+        pending = 0
+        async with db_engine.connect() as connection:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    await connection.commit()
+                    return stored
+                target_date, rows = item
+                inserted = await upsert_prices(connection, prices_table, rows, args.chunk_size)
+                stored += inserted
+                pending += 1
+                if pending >= COMMIT_EVERY_BATCHES:
+                    await connection.commit()
+                    pending = 0
+                LOGGER.info("%s: stored %d rows", target_date, inserted)
+
+    async def fetch_one(session: aiohttp.ClientSession, target_date: date) -> None:
+        try:
+            rows = await afetch_grouped_rows(
+                session=session,
+                semaphore=semaphore,
+                api_key=args.polygon_key,
+                target_date=target_date,
+                start_dates=start_dates,
+                adjusted=args.adjusted,
+                limiter=limiter,
+            )
+        except Exception as exc:
+            LOGGER.exception("Failed to fetch grouped aggregates for %s: %s", target_date, exc)
+            return
+        await queue.put((target_date, rows))
+
+    try:
+        connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENT_REQUESTS)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            writer_task = asyncio.create_task(writer())
+            producers = asyncio.gather(*(fetch_one(session, target_date) for target_date in dates))
+            # Same race as the per-symbol path: a dead writer must fail the
+            # run rather than leave producers blocked on the full queue.
+            await asyncio.wait({producers, writer_task}, return_when=asyncio.FIRST_COMPLETED)
+            if writer_task.done():
+                producers.cancel()
+                try:
+                    await producers
+                except asyncio.CancelledError:
+                    pass
+                return await writer_task
+            await producers
+            await queue.put(None)
+            return await writer_task
+    finally:
+        await db_engine.dispose()
 
 
 def main() -> None:
@@ -245,28 +576,25 @@ def main() -> None:
     config = load_database_config_from_args(args)
     engine = create_engine_from_config(config)
     prices_table = create_tables(engine)
-    symbols = fetch_symbols(engine)
+    symbols_with_latest = fetch_symbols_with_latest(engine, prices_table)
 
-    if not symbols:
+    if not symbols_with_latest:
         LOGGER.warning("No symbols found in companies table.")
         return
 
-    latest_trade_dates = fetch_latest_trade_dates(engine, prices_table)
+    args.chunk_size = effective_chunk_size(engine, prices_table, args.chunk_size)
 
     LOGGER.info(
         "Fetching prices for %d symbols up to %s (%s)",
-        len(symbols),
+        len(symbols_with_latest),
         end_date,
         "adjusted" if args.adjusted else "raw",
     )
     if args.start_date:
         LOGGER.info("Using explicit start date %s for all symbols.", args.start_date)
 
-    client = RESTClient(args.polygon_key)
-
-    total_rows = 0
-    for symbol in symbols:
-        last_trade_date = latest_trade_dates.get(symbol)
+    work: List[Tuple[str, date]] = []
+    for symbol, last_trade_date in symbols_with_latest:
         if last_trade_date:
             start_date = last_trade_date + timedelta(days=1)
         elif args.start_date:
@@ -277,28 +605,21 @@ def main() -> None:
         if start_date > end_date:
             LOGGER.debug("%s: up to date (latest %s)", symbol, last_trade_date)
             continue
-
-        try:
-            rows = fetch_price_rows(
-                client=client,
-                symbol=symbol,
-                multiplier=args.multiplier,
-                timespan=args.timespan,
-                start_date=start_date,
-                end_date=end_date,
-                limit=args.limit,
-                adjusted=args.adjusted,
-            )
-        except Exception as exc:
-            LOGGER.exception("Failed to fetch data for %s: %s", symbol, exc)
-            continue
-
-        inserted = upsert_prices(engine, prices_table, rows, args.chunk_size)
-        total_rows += inserted
-        LOGGER.info("%s: stored %d rows (from %s to %s)", symbol, inserted, start_date, end_date)
-
-        if args.sleep:
-            time.sleep(args.sleep)
+        work.append((symbol, start_date))
+
+    if args.multiplier == 1 and args.timespan == "day":
+        # Default daily bars: one grouped request per trading day covers
+        # every symbol at once instead of a request per ticker.
+        start_dates = dict(work)
+        earliest = min(start_dates.values(), default=end_date)
+        dates = list(business_days(earliest, end_date))
+        total_rows = asyncio.run(
+            fetch_and_store_grouped(config, prices_table, start_dates, dates, args)
+        )
+    else:
+        total_rows = asyncio.run(
+            fetch_and_store_prices(config, prices_table, work, end_date, args)
+        )
 
     LOGGER.info("Import complete. Stored %d rows.", total_rows)
 
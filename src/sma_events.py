@@ -5,30 +5,28 @@ from __future__ import annotations
 import argparse
 import logging
 import os
-from datetime import date, timedelta
-from typing import Dict, Iterable, Iterator, List, Tuple
+from typing import Sequence, Tuple
 
-import pandas as pd
 from sqlalchemy import (
     Column,
     Date,
     DateTime,
     Float,
+    Index,
     Integer,
     MetaData,
     String,
     Table,
     func,
     inspect,
-    select,
     text,
 )
-from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.engine import Engine
 
 from db import (
     add_config_argument,
     create_engine_from_config,
+    ensure_index,
     load_database_config_from_args,
     reflect_table,
 )
@@ -36,7 +34,7 @@ from db import (
 LOGGER = logging.getLogger(__name__)
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     add_config_argument(parser)
     parser.add_argument(
@@ -51,18 +49,12 @@ def parse_args() -> argparse.Namespace:
         default=200,
         help="Long SMA window length (default: %(default)s)",
     )
-    parser.add_argument(
-        "--chunk-size",
-        type=int,
-        default=500,
-        help="Rows to upsert per batch (default: %(default)s)",
-    )
     parser.add_argument(
         "--log-level",
         default=os.getenv("LOG_LEVEL", "INFO"),
         help="Logging level (default: %(default)s)",
     )
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 def create_tables(engine: Engine) -> Tuple[Table, Table]:
@@ -80,10 +72,21 @@ def create_tables(engine: Engine) -> Tuple[Table, Table]:
         Column("short_sma", Float),
         Column("long_sma", Float),
         Column("created_at", DateTime, server_default=func.now(), nullable=False),
+        # The reports filter by event_date/event_type (and long_window for the
+        # 200-day section); this keeps those scans off the full table.
+        Index("idx_sma_events_eventdate_type", "event_date", "event_type", "long_window"),
         mysql_charset="utf8mb4",
         mysql_collate="utf8mb4_unicode_ci",
     )
     metadata.create_all(engine, checkfirst=True)
+    # create_all skips tables that already exist, so bring live schemas up
+    # to date explicitly.
+    ensure_index(
+        engine,
+        "sma_events",
+        "idx_sma_events_eventdate_type",
+        ("event_date", "event_type", "long_window"),
+    )
 
     inspector = inspect(engine)
     column_names = {column["name"] for column in inspector.get_columns("sma_events")}
@@ -96,215 +99,97 @@ def create_tables(engine: Engine) -> Tuple[Table, Table]:
     return prices, sma_events
 
 
-def fetch_symbols(engine: Engine, prices: Table) -> List[str]:
-    with engine.connect() as connection:
-        result = connection.execute(select(prices.c.symbol).distinct())
-        symbols = [row[0] for row in result if row[0]]
-    return symbols
-
-
-def load_existing_events(
-    engine: Engine, sma_events: Table
-) -> Tuple[Dict[Tuple[str, date, str], bool], Dict[str, date]]:
-    events: Dict[Tuple[str, date, str], bool] = {}
-    latest_by_symbol: Dict[str, date] = {}
-    with engine.connect() as connection:
-        result = connection.execute(select(sma_events.c.symbol, sma_events.c.event_date, sma_events.c.event_type))
-        for row in result:
-            events[(row.symbol, row.event_date, row.event_type)] = True
-            current_latest = latest_by_symbol.get(row.symbol)
-            if current_latest is None or row.event_date > current_latest:
-                latest_by_symbol[row.symbol] = row.event_date
-    return events, latest_by_symbol
-
-
-def fetch_price_history(
-    engine: Engine,
-    prices: Table,
-    symbol: str,
-    start_date: date | None = None,
-) -> pd.DataFrame:
-    with engine.connect() as connection:
-        query = (
-            select(prices.c.trade_date, prices.c.close)
-            .where(prices.c.symbol == symbol)
-            .order_by(prices.c.trade_date.asc())
-        )
-        if start_date:
-            query = query.where(prices.c.trade_date >= start_date)
-        result = connection.execute(query)
-        rows = result.fetchall()
-
-    if not rows:
-        return pd.DataFrame(columns=["trade_date", "close"])
-
-    frame = pd.DataFrame(rows, columns=["trade_date", "close"])
-    frame = frame.dropna(subset=["close"])
-    frame["close"] = frame["close"].astype(float)
-    return frame
-
-
-def compute_sma_events(
-    frame: pd.DataFrame,
-    symbol: str,
-    short_window: int,
-    long_window: int,
-) -> List[Dict[str, object]]:
-    if frame.empty:
-        return []
-
-    frame = frame.sort_values("trade_date").reset_index(drop=True)
-    frame["short_sma"] = frame["close"].rolling(window=short_window, min_periods=short_window).mean()
-    frame["long_sma"] = frame["close"].rolling(window=long_window, min_periods=long_window).mean()
-
-    events: List[Dict[str, object]] = []
-
-    previous_short_diff: float | None = None
-    previous_long_diff: float | None = None
-    previous_sma_diff: float | None = None
-
-    for _, row in frame.iterrows():
-        close_price = float(row["close"])
-        trade_date = row["trade_date"]
-        short_sma = row["short_sma"]
-        long_sma = row["long_sma"]
-
-        short_valid = pd.notna(short_sma)
-        long_valid = pd.notna(long_sma)
-
-        if short_valid:
-            short_diff = close_price - float(short_sma)
-            if previous_short_diff is not None:
-                if previous_short_diff <= 0 < short_diff:
-                    events.append(
-                        {
-                            "symbol": symbol,
-                            "event_date": trade_date,
-                            "event_type": "price_cross_short_up",
-                            "short_window": short_window,
-                            "long_window": long_window,
-                            "close_price": close_price,
-                            "short_sma": float(short_sma),
-                            "long_sma": float(long_sma) if long_valid else None,
-                        }
-                    )
-                elif previous_short_diff >= 0 > short_diff:
-                    events.append(
-                        {
-                            "symbol": symbol,
-                            "event_date": trade_date,
-                            "event_type": "price_cross_short_down",
-                            "short_window": short_window,
-                            "long_window": long_window,
-                            "close_price": close_price,
-                            "short_sma": float(short_sma),
-                            "long_sma": float(long_sma) if long_valid else None,
-                        }
-                    )
-            previous_short_diff = short_diff
-        else:
-            previous_short_diff = None
-
-        if long_valid:
-            long_diff = close_price - float(long_sma)
-            if previous_long_diff is not None:
-                if previous_long_diff <= 0 < long_diff:
-                    events.append(
-                        {
-                            "symbol": symbol,
-                            "event_date": trade_date,
-                            "event_type": "price_cross_long_up",
-                            "short_window": short_window,
-                            "long_window": long_window,
-                            "close_price": close_price,
-                            "short_sma": float(short_sma) if short_valid else None,
-                            "long_sma": float(long_sma),
-                        }
-                    )
-                elif previous_long_diff >= 0 > long_diff:
-                    events.append(
-                        {
-                            "symbol": symbol,
-                            "event_date": trade_date,
-                            "event_type": "price_cross_long_down",
-                            "short_window": short_window,
-                            "long_window": long_window,
-                            "close_price": close_price,
-                            "short_sma": float(short_sma) if short_valid else None,
-                            "long_sma": float(long_sma),
-                        }
-                    )
-            previous_long_diff = long_diff
-        else:
-            previous_long_diff = None
-
-        if short_valid and long_valid:
-            sma_diff = float(short_sma) - float(long_sma)
-            if previous_sma_diff is not None:
-                if previous_sma_diff <= 0 < sma_diff:
-                    events.append(
-                        {
-                            "symbol": symbol,
-                            "event_date": trade_date,
-                            "event_type": "golden_cross",
-                            "short_window": short_window,
-                            "long_window": long_window,
-                            "close_price": close_price,
-                            "short_sma": float(short_sma),
-                            "long_sma": float(long_sma),
-                        }
-                    )
-                elif previous_sma_diff >= 0 > sma_diff:
-                    events.append(
-                        {
-                            "symbol": symbol,
-                            "event_date": trade_date,
-                            "event_type": "death_cross",
-                            "short_window": short_window,
-                            "long_window": long_window,
-                            "close_price": close_price,
-                            "short_sma": float(short_sma),
-                            "long_sma": float(long_sma),
-                        }
-                    )
-            previous_sma_diff = sma_diff
-        else:
-            previous_sma_diff = None
-
-    return events
-
-
-def chunked(iterable: Iterable[Dict[str, object]], size: int) -> Iterator[List[Dict[str, object]]]:
-    chunk: List[Dict[str, object]] = []
-    for item in iterable:
-        chunk.append(item)
-        if len(chunk) >= size:
-            yield chunk
-            chunk = []
-    if chunk:
-        yield chunk
-
-
-def upsert_events(engine: Engine, sma_events: Table, rows: List[Dict[str, object]], chunk_size: int = 500) -> int:
-    if not rows:
-        return 0
-
-    inserted = 0
+def compute_and_store_events(engine: Engine, short_window: int, long_window: int) -> int:
+    """Detect and upsert all crossover events with one in-database statement.
+
+    Both SMAs, their lagged diffs and the crossing classification are computed
+    by MySQL window functions, so no price history crosses the wire and no
+    per-row Python loop runs. Rows at or before each symbol's latest stored
+    event are filtered out, making reruns incremental. The windows scan each
+    symbol's full history because an SMA needs its warm-up rows regardless of
+    where the insert cutoff lies.
+
+    Event rows are immutable once detected, so duplicates are dropped with
+    INSERT IGNORE rather than rewritten; the primary key does the dedup.
+
+    Returns the number of rows inserted.
+    """
+
+    # Window frame bounds cannot be bound parameters in MySQL; both values
+    # come from argparse as validated ints.
+    short_window = int(short_window)
+    long_window = int(long_window)
+    query = text(
+        f"""
+        INSERT IGNORE INTO sma_events
+            (symbol, event_date, event_type, short_window, long_window,
+             close_price, short_sma, long_sma)
+        SELECT new_rows.symbol, new_rows.event_date, new_rows.event_type,
+               {short_window}, {long_window},
+               new_rows.close_price, new_rows.short_sma, new_rows.long_sma
+        FROM (
+            WITH windowed AS (
+                SELECT symbol, trade_date, close,
+                       CASE WHEN COUNT(close) OVER w_short >= {short_window}
+                            THEN AVG(close) OVER w_short END AS short_sma,
+                       CASE WHEN COUNT(close) OVER w_long >= {long_window}
+                            THEN AVG(close) OVER w_long END AS long_sma
+                FROM prices
+                WHERE close IS NOT NULL
+                WINDOW w_short AS (PARTITION BY symbol ORDER BY trade_date
+                                   ROWS BETWEEN {short_window - 1} PRECEDING AND CURRENT ROW),
+                       w_long AS (PARTITION BY symbol ORDER BY trade_date
+                                  ROWS BETWEEN {long_window - 1} PRECEDING AND CURRENT ROW)
+            ),
+            diffs AS (
+                SELECT symbol, trade_date, close, short_sma, long_sma,
+                       close - short_sma AS short_diff,
+                       close - long_sma AS long_diff,
+                       short_sma - long_sma AS sma_diff,
+                       LAG(close - short_sma) OVER w AS prev_short_diff,
+                       LAG(close - long_sma) OVER w AS prev_long_diff,
+                       LAG(short_sma - long_sma) OVER w AS prev_sma_diff
+                FROM windowed
+                WINDOW w AS (PARTITION BY symbol ORDER BY trade_date)
+            )
+            SELECT symbol, trade_date AS event_date,
+                   CASE WHEN prev_short_diff <= 0 AND short_diff > 0 THEN 'price_cross_short_up'
+                        WHEN prev_short_diff >= 0 AND short_diff < 0 THEN 'price_cross_short_down'
+                   END AS event_type,
+                   close AS close_price, short_sma, long_sma
+            FROM diffs
+            UNION ALL
+            SELECT symbol, trade_date,
+                   CASE WHEN prev_long_diff <= 0 AND long_diff > 0 THEN 'price_cross_long_up'
+                        WHEN prev_long_diff >= 0 AND long_diff < 0 THEN 'price_cross_long_down'
+                   END,
+                   close, short_sma, long_sma
+            FROM diffs
+            UNION ALL
+            SELECT symbol, trade_date,
+                   CASE WHEN prev_sma_diff <= 0 AND sma_diff > 0 THEN 'golden_cross'
+                        WHEN prev_sma_diff >= 0 AND sma_diff < 0 THEN 'death_cross'
+                   END,
+                   close, short_sma, long_sma
+            FROM diffs
+        ) AS new_rows
+        LEFT JOIN (
+            SELECT symbol, MAX(event_date) AS latest_event_date
+            FROM sma_events
+            GROUP BY symbol
+        ) latest ON latest.symbol = new_rows.symbol
+        WHERE new_rows.event_type IS NOT NULL
+          AND (latest.latest_event_date IS NULL
+               OR new_rows.event_date > latest.latest_event_date)
+        """
+    )
     with engine.begin() as connection:
-        for batch in chunked(rows, chunk_size):
-            stmt = mysql_insert(sma_events).values(batch)
-            update_columns = {}
-            for column in sma_events.columns:
-                if column.primary_key or column.name == "created_at":
-                    continue
-                update_columns[column.name] = getattr(stmt.inserted, column.name)
-            connection.execute(stmt.on_duplicate_key_update(**update_columns))
-            inserted += len(batch)
-    return inserted
+        result = connection.execute(query)
+        return result.rowcount or 0
 
 
-def main() -> None:
-    args = parse_args()
+def main(argv: Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
     logging.basicConfig(level=getattr(logging, str(args.log_level).upper(), logging.INFO), format="%(levelname)s %(message)s")
 
     if args.short_window <= 0 or args.long_window <= 0:
@@ -314,53 +199,14 @@ def main() -> None:
 
     config = load_database_config_from_args(args)
     engine = create_engine_from_config(config)
-    prices_table, sma_events_table = create_tables(engine)
-
-    symbols = fetch_symbols(engine, prices_table)
-    if not symbols:
-        LOGGER.warning("No symbols found in prices table.")
-        return
-
-    existing_events, latest_event_dates = load_existing_events(engine, sma_events_table)
-    total_inserted = 0
+    create_tables(engine)
 
     LOGGER.info(
-        "Processing %d symbols for SMA and price crossover events (short=%d, long=%d)",
-        len(symbols),
+        "Computing SMA and price crossover events in-database (short=%d, long=%d)",
         args.short_window,
         args.long_window,
     )
-
-    for symbol in symbols:
-        latest_event_date = latest_event_dates.get(symbol)
-        start_date_filter = None
-        if latest_event_date:
-            lookback_days = max(args.long_window, args.short_window) + 5
-            start_date_filter = latest_event_date - timedelta(days=lookback_days)
-
-        frame = fetch_price_history(engine, prices_table, symbol, start_date=start_date_filter)
-        events = compute_sma_events(frame, symbol, args.short_window, args.long_window)
-
-        new_events = [
-            event
-            for event in events
-            if (event["symbol"], event["event_date"], event["event_type"]) not in existing_events
-        ]
-        if not new_events:
-            LOGGER.debug("%s: no new events detected.", symbol)
-            continue
-
-        inserted = upsert_events(engine, sma_events_table, new_events, chunk_size=args.chunk_size)
-        total_inserted += inserted
-
-        for event in new_events:
-            existing_events[(event["symbol"], event["event_date"], event["event_type"])] = True
-            current_latest = latest_event_dates.get(event["symbol"])
-            if current_latest is None or event["event_date"] > current_latest:
-                latest_event_dates[event["symbol"]] = event["event_date"]
-
-        LOGGER.info("%s: recorded %d new SMA-related events.", symbol, inserted)
-
+    total_inserted = compute_and_store_events(engine, args.short_window, args.long_window)
     LOGGER.info("Completed processing. %d new events stored.", total_inserted)
 
 
@@ -15,21 +15,29 @@ Author: Masonias Team
 # ============================================================================
 
 # Flask and web framework
-from flask import Flask, Blueprint, render_template, request, jsonify
+from flask import Flask, Blueprint, render_template, request, jsonify, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+# Fast JSON encoding
+import orjson
+
 # Database
 import sqlalchemy
+import sqlparse
 from db import load_database_config, create_engine_from_config
 
 # Standard library
 import re
 import os
 import threading
-import sys
+import gzip
 import io
+from concurrent.futures import ThreadPoolExecutor
+import time
 import traceback
 import yaml
+from functools import lru_cache
 from datetime import datetime, date
 from collections import deque
 from contextlib import redirect_stdout, redirect_stderr
@@ -46,6 +54,25 @@ import sma_events
 
 app = Flask(__name__)
 
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson.
+
+    /db/query responses can carry thousands of rows, where stdlib json
+    encoding dominates response time. orjson encodes date/datetime values
+    (trade_date columns) natively; anything it can't handle falls back to
+    Flask's default() hook.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app.json = ORJSONProvider(app)
+
 # Create blueprints for organizing routes
 db_bp = Blueprint('db', __name__, url_prefix='/db')
 services_bp = Blueprint('services', __name__, url_prefix='/services')
@@ -58,9 +85,58 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 # DATABASE CONFIGURATION
 # ============================================================================
 
-# Initialize database connection
+# Initialize database connection.
+# The web process is long-lived and serves concurrent requests, so size the
+# pool accordingly. Recycling connections hourly (well below MySQL's default
+# wait_timeout) keeps them fresh without pre-ping's SELECT-per-checkout tax
+# on every query.
 db_config = load_database_config()
-engine = create_engine_from_config(db_config)
+POOL_SIZE = 10
+engine = create_engine_from_config(
+    db_config,
+    pool_pre_ping=False,
+    pool_size=POOL_SIZE,
+    max_overflow=20,
+    pool_recycle=3600,
+)
+
+# Warm the pool at startup: open pool_size connections at once (so each
+# checkout creates a fresh one) and return them, leaving the first requests
+# with established connections instead of TCP + auth handshakes.
+try:
+    _warm = [engine.connect() for _ in range(POOL_SIZE)]
+    for _conn in _warm:
+        _conn.close()
+    del _warm, _conn
+except sqlalchemy.exc.OperationalError:
+    # Database not reachable yet; the pool will connect lazily on demand.
+    pass
+
+
+@lru_cache(maxsize=256)
+def _text(sql: str) -> sqlalchemy.TextClause:
+    """Cache TextClause construction for repeated statements."""
+    return sqlalchemy.text(sql)
+
+
+# In-process cache for the table list; the schema changes rarely enough that
+# a short TTL removes a round trip from most /db/tables requests.
+TABLES_CACHE_TTL_SECONDS = 30
+_tables_cache = {'expires': 0.0, 'tables': None}
+
+# Per-table column cache for /db/schema, same TTL rationale as above.
+SCHEMA_CACHE_TTL_SECONDS = 30
+_schema_cache = {}  # table_name -> {'expires': float, 'columns': list}
+
+# DESCRIBE can't take a bound table name; information_schema can, so the
+# statement is compiled once and the name travels as a bind parameter.
+_SCHEMA_SQL = """
+    SELECT column_name, column_type, is_nullable, column_key,
+           column_default, extra
+    FROM information_schema.columns
+    WHERE table_schema = DATABASE() AND table_name = :table_name
+    ORDER BY ordinal_position
+"""
 
 # ============================================================================
 # API KEYS CONFIGURATION
@@ -72,7 +148,9 @@ full_config = {}
 
 if os.path.exists(config_path):
     with open(config_path, 'r') as f:
-        full_config = yaml.safe_load(f) or {}
+        # libyaml parser when available (same fallback as db.py); identical
+        # safety semantics to safe_load, much faster on worker forks.
+        full_config = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
 
 # Set environment variables from config if not already set
 # This allows services to access API keys without passing them explicitly
@@ -91,17 +169,44 @@ if 'openai' in full_config and 'api_key' in full_config['openai']:
 # Global job tracking storage
 jobs = {}  # Dict mapping job_id -> job_info
 job_counter = 0  # Auto-incrementing counter for job IDs
-job_lock = threading.Lock()  # Thread lock for safe concurrent access
+job_lock = threading.Lock()  # Guards insert/delete on the jobs dict itself
+completed_job_ids = deque()  # Finished job IDs in completion order (oldest first)
+# Each job entry carries its own 'lock' guarding that job's fields and logs,
+# so concurrent jobs never contend on a shared mutex while logging.
 
 # Constants
+MAX_QUERY_ROWS = 10000  # Maximum rows returned by /db/query before truncating
 MAX_LOG_LINES = 1000  # Maximum number of log lines to keep per job
+MAX_LOG_LINE_CHARS = 64 * 1024  # Pending newline-free output is force-flushed past this
 MAX_COMPLETED_JOBS = 10  # Maximum number of completed jobs to keep in memory
-VALID_SERVICES = [
-    'fetch_prices',        # Fetch stock prices from Polygon API
-    'daily_report',        # Generate daily market report
-    'thirty_day_report',   # Generate 30-day market summary
-    'compute_sma_events'   # Compute SMA crossover events
-]
+MAX_JOB_WORKERS = 4  # Worker threads executing service jobs
+MAX_PENDING_JOBS = 8  # Queued jobs beyond which /services/run returns 429
+
+# Bounded pool for service jobs; a burst of submissions queues here instead
+# of spawning one thread per job.
+job_executor = ThreadPoolExecutor(max_workers=MAX_JOB_WORKERS)
+def _fetch_prices_argv(params):
+    return ['--date', params['date']] if params.get('date') else []
+
+def _report_date_argv(params):
+    return ['--report-date', params['report_date']] if params.get('report_date') else []
+
+def _sma_events_argv(params):
+    argv = []
+    if params.get('short_window'):
+        argv.extend(['--short-window', str(params['short_window'])])
+    if params.get('long_window'):
+        argv.extend(['--long-window', str(params['long_window'])])
+    return argv
+
+# Service registry: name -> (entry point, argv builder). Validation and
+# dispatch are single dict lookups instead of if/elif chains.
+SERVICES = {
+    'fetch_prices': (all_prices.main, _fetch_prices_argv),        # Fetch stock prices from Polygon API
+    'daily_report': (generate_report.main, _report_date_argv),    # Generate daily market report
+    'thirty_day_report': (thirty_day_report.main, _report_date_argv),  # Generate 30-day market summary
+    'compute_sma_events': (sma_events.main, _sma_events_argv),    # Compute SMA crossover events
+}
 
 # ============================================================================
 # UTILITY FUNCTIONS
@@ -109,12 +214,12 @@ VALID_SERVICES = [
 
 def is_read_only_query(query: str) -> bool:
     """
-    Validate that a SQL query is read-only (SELECT only).
+    Validate that a SQL query is read-only (a single SELECT statement).
 
-    This security function prevents destructive operations by:
-    1. Stripping SQL comments
-    2. Checking the query starts with SELECT
-    3. Blocking dangerous keywords (INSERT, UPDATE, DELETE, etc.)
+    The query is tokenized with sqlparse rather than scanned with regexes:
+    one pass classifies the statement type, comments are handled by the
+    tokenizer, and keywords inside string literals (e.g. SELECT 'DROP')
+    no longer cause false rejections.
 
     Args:
         query: SQL query string to validate
@@ -122,68 +227,64 @@ def is_read_only_query(query: str) -> bool:
     Returns:
         True if query is safe (read-only), False otherwise
     """
-    # Remove SQL comments (both -- and /* */ styles)
-    query_normalized = re.sub(r'--.*$', '', query, flags=re.MULTILINE)
-    query_normalized = re.sub(r'/\*.*?\*/', '', query_normalized, flags=re.DOTALL)
-    query_normalized = query_normalized.strip().upper()
-
-    # Must start with SELECT
-    if not query_normalized.startswith('SELECT'):
+    # Fast path: a statement that plainly doesn't begin with SELECT (or
+    # something that could precede one — a CTE, parenthesis or comment)
+    # is rejected without tokenizing what may be a large pasted script.
+    head = query.lstrip()[:8].upper()
+    if not head.startswith(('SELECT', 'WITH', '(', '--', '/*')):
         return False
 
-    # Block any dangerous keywords that could modify data
-    dangerous_keywords = [
-        'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER',
-        'TRUNCATE', 'GRANT', 'REVOKE', 'EXEC', 'EXECUTE'
-    ]
+    parsed = sqlparse.parse(query)
 
-    for keyword in dangerous_keywords:
-        # Use word boundaries to avoid false positives
-        if re.search(r'\b' + keyword + r'\b', query_normalized):
-            return False
+    # Exactly one statement; stacked statements are rejected outright.
+    statements = [stmt for stmt in parsed if stmt.tokens and not stmt.is_whitespace]
+    if len(statements) != 1:
+        return False
 
-    return True
+    return statements[0].get_type() == 'SELECT'
 
-def cleanup_old_jobs():
+def _gzip_stream(source, flush_threshold=64 * 1024):
+    """
+    Compress an iterable of byte chunks into gzip-encoded chunks.
+
+    Compressed output accumulates in a small buffer that is yielded every
+    time it passes flush_threshold, so the response stays chunked and
+    memory stays bounded regardless of result size.
+    """
+    buf = io.BytesIO()
+    compressor = gzip.GzipFile(fileobj=buf, mode='wb')
+    for chunk in source:
+        compressor.write(chunk)
+        if buf.tell() >= flush_threshold:
+            data = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            yield data
+    compressor.close()
+    yield buf.getvalue()
+
+def _iso(timestamp):
+    """Format a stored epoch timestamp as ISO 8601; None passes through."""
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+def cleanup_old_jobs(job_id):
     """
-    Clean up old completed jobs to prevent memory overflow.
+    Record a finished job and evict old completed jobs in O(1).
 
-    Keeps all running jobs and only the MAX_COMPLETED_JOBS most recent
-    completed/failed jobs. Should be called after each job completion.
+    Finished job IDs are appended to a FIFO deque; once more than
+    MAX_COMPLETED_JOBS have finished, the oldest are dropped from the
+    jobs dict. Running jobs never appear in the deque, so they are
+    never evicted. Called after each job completion with its job_id.
 
     This function is thread-safe and uses the job_lock.
     """
     with job_lock:
-        # Separate running and completed jobs
-        running_jobs = {}
-        completed_jobs = []
-
-        for job_id, job in jobs.items():
-            if job['status'] == 'running':
-                running_jobs[job_id] = job
-            else:
-                completed_jobs.append((job_id, job))
-
-        # Sort completed jobs by end_time (newest first)
-        # Jobs without end_time go to the end
-        completed_jobs.sort(
-            key=lambda x: x[1].get('end_time', ''),
-            reverse=True
-        )
-
-        # Keep only the most recent MAX_COMPLETED_JOBS completed jobs
-        jobs_to_keep = dict(completed_jobs[:MAX_COMPLETED_JOBS])
-
-        # Update global jobs dict with running + recent completed jobs
-        jobs.clear()
-        jobs.update(running_jobs)
-        jobs.update(jobs_to_keep)
-
-        # Log cleanup if jobs were removed
-        removed_count = len(completed_jobs) - len(jobs_to_keep)
-        if removed_count > 0:
-            print(f"Cleaned up {removed_count} old job(s). "
-                  f"Keeping {len(running_jobs)} running + {len(jobs_to_keep)} completed jobs.")
+        completed_job_ids.append(job_id)
+        while len(completed_job_ids) > MAX_COMPLETED_JOBS:
+            evicted = completed_job_ids.popleft()
+            jobs.pop(evicted, None)
 
 # ============================================================================
 # DATABASE QUERY BLUEPRINT - Routes for /db/*
@@ -220,23 +321,55 @@ def execute_query():
                 'error': 'Only SELECT queries are allowed. No INSERT, UPDATE, DELETE, DROP, etc.'
             }), 400
 
-        # Execute query against database
-        with engine.connect() as conn:
-            result = conn.execute(sqlalchemy.text(query))
-
-            # Extract column names
+        # Execute up front so bad SQL still returns a 400; the server-side
+        # cursor (stream_results + yield_per) means execution buffers only
+        # ~1000 rows, not the whole result set.
+        conn = engine.connect()
+        try:
+            result = conn.execution_options(stream_results=True, yield_per=1000).execute(
+                _text(query)
+            )
             columns = list(result.keys())
-
-            # Convert rows to list of dictionaries
-            rows = []
-            for row in result:
-                rows.append(dict(zip(columns, row)))
-
-            return jsonify({
-                'columns': columns,
-                'rows': rows,
-                'row_count': len(rows)
-            })
+        except BaseException:
+            conn.close()
+            raise
+
+        def generate():
+            # Rows are encoded and written out one at a time, so the giant
+            # intermediate list of dicts never exists and the first bytes
+            # reach the client before the last row is fetched. A mid-stream
+            # failure truncates the response body; the common errors (bad
+            # SQL) already surfaced at execute time above.
+            try:
+                yield b'{"columns":' + orjson.dumps(columns) + b',"rows":['
+                count = 0
+                truncated = False
+                for row in result.mappings():
+                    if count >= MAX_QUERY_ROWS:
+                        truncated = True
+                        break
+                    encoded = orjson.dumps(dict(row), default=app.json.default)
+                    yield encoded if count == 0 else b',' + encoded
+                    count += 1
+                yield (
+                    b'],"row_count":' + str(count).encode()
+                    + b',"truncated":' + (b'true' if truncated else b'false') + b'}'
+                )
+            finally:
+                conn.close()
+
+        # JSON rows compress roughly 10x; gzip the stream in chunks when the
+        # client advertises support so large results cost bandwidth, not RAM.
+        if 'gzip' in request.accept_encodings:
+            response = Response(
+                stream_with_context(_gzip_stream(generate())),
+                mimetype='application/json',
+            )
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
+
+        return Response(stream_with_context(generate()), mimetype='application/json')
 
     except sqlalchemy.exc.SQLAlchemyError as e:
         # Database-specific errors
@@ -254,10 +387,18 @@ def get_tables():
         JSON with list of table names
     """
     try:
+        now = time.monotonic()
+        refresh = request.args.get('refresh') == '1'
+        if not refresh and _tables_cache['tables'] is not None and now < _tables_cache['expires']:
+            return jsonify({'tables': _tables_cache['tables']})
+
         with engine.connect() as conn:
-            result = conn.execute(sqlalchemy.text("SHOW TABLES"))
+            result = conn.execute(_text("SHOW TABLES"))
             tables = [row[0] for row in result]
-            return jsonify({'tables': tables})
+
+        _tables_cache['tables'] = tables
+        _tables_cache['expires'] = now + TABLES_CACHE_TTL_SECONDS
+        return jsonify({'tables': tables})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -273,13 +414,20 @@ def get_schema(table_name):
         JSON with column information (field, type, null, key, default, extra)
     """
     try:
-        # Security: Validate table name contains only alphanumeric and underscore
-        # This prevents SQL injection attacks
+        # Validate table name contains only alphanumeric and underscore.
+        # The name is passed as a bind parameter below, so this is input
+        # hygiene (fast 400 on garbage) rather than injection defense.
         if not re.match(r'^[a-zA-Z0-9_]+$', table_name):
             return jsonify({'error': 'Invalid table name'}), 400
 
+        now = time.monotonic()
+        if request.args.get('refresh') != '1':
+            cached = _schema_cache.get(table_name)
+            if cached is not None and now < cached['expires']:
+                return jsonify({'columns': cached['columns']})
+
         with engine.connect() as conn:
-            result = conn.execute(sqlalchemy.text(f"DESCRIBE {table_name}"))
+            result = conn.execute(_text(_SCHEMA_SQL), {'table_name': table_name})
             columns = []
             for row in result:
                 columns.append({
@@ -290,7 +438,12 @@ def get_schema(table_name):
                     'default': row[4],
                     'extra': row[5]
                 })
-            return jsonify({'columns': columns})
+
+        _schema_cache[table_name] = {
+            'expires': now + SCHEMA_CACHE_TTL_SECONDS,
+            'columns': columns,
+        }
+        return jsonify({'columns': columns})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -325,8 +478,12 @@ def run_service():
         params = data.get('params', {})
 
         # Validate service name
-        if service_name not in VALID_SERVICES:
-            return jsonify({'error': f'Invalid service name. Valid options: {VALID_SERVICES}'}), 400
+        if service_name not in SERVICES:
+            return jsonify({'error': f'Invalid service name. Valid options: {list(SERVICES)}'}), 400
+
+        # Shed load before creating a job entry when the pool backlog is deep
+        if job_executor._work_queue.qsize() >= MAX_PENDING_JOBS:
+            return jsonify({'error': 'Too many queued jobs. Try again shortly.'}), 429
 
         # Create job entry with thread-safe locking
         with job_lock:
@@ -337,17 +494,15 @@ def run_service():
                 'service': service_name,
                 'params': params,
                 'status': 'running',
-                'start_time': datetime.now().isoformat(),
+                'start_time': time.time(),  # Epoch float; formatted at response time
                 'end_time': None,
                 'logs': deque(maxlen=MAX_LOG_LINES),  # Circular buffer for logs
-                'exit_code': None
+                'exit_code': None,
+                'lock': threading.Lock()  # Per-job lock for fields and logs
             }
 
-        # Start background thread to execute the job
-        # Daemon thread will automatically terminate when main program exits
-        thread = threading.Thread(target=execute_job, args=(job_id, service_name, params))
-        thread.daemon = True
-        thread.start()
+        # Submit to the bounded worker pool; runs as soon as a worker frees up
+        job_executor.submit(execute_job, job_id, service_name, params)
 
         return jsonify({
             'job_id': job_id,
@@ -368,23 +523,27 @@ def list_jobs():
     Returns:
         JSON with list of jobs (without logs)
     """
+    # Jobs are only ever inserted at creation time, so the dict's insertion
+    # order is creation order; the newest 10 are the last 10 values. That
+    # replaces the old sort-everything-by-ISO-start-time with a tail slice.
     with job_lock:
-        job_list = []
-        for job_id, job in jobs.items():
-            # Return job info without logs (logs can be large)
-            job_list.append({
-                'id': job['id'],
-                'service': job['service'],
-                'params': job['params'],
-                'status': job['status'],
-                'start_time': job['start_time'],
-                'end_time': job['end_time'],
-                'exit_code': job['exit_code']
-            })
-
-        # Sort by start time (newest first) and limit to 10
-        job_list.sort(key=lambda x: x['start_time'], reverse=True)
-        return jsonify({'jobs': job_list[:10]})
+        snapshot = list(jobs.values())[-10:]
+    snapshot.reverse()
+
+    job_list = []
+    for job in snapshot:
+        # Return job info without logs (logs can be large)
+        job_list.append({
+            'id': job['id'],
+            'service': job['service'],
+            'params': job['params'],
+            'status': job['status'],
+            'start_time': _iso(job['start_time']),
+            'end_time': _iso(job['end_time']),
+            'exit_code': job['exit_code']
+        })
+
+    return jsonify({'jobs': job_list})
 
 @services_bp.route('/jobs/<job_id>')
 def get_job_status(job_id):
@@ -397,34 +556,42 @@ def get_job_status(job_id):
     Returns:
         JSON with complete job information including logs
     """
-    with job_lock:
-        if job_id not in jobs:
-            return jsonify({'error': 'Job not found'}), 404
-
-        job = jobs[job_id]
-        return jsonify({
-            'id': job['id'],
-            'service': job['service'],
-            'params': job['params'],
-            'status': job['status'],
-            'start_time': job['start_time'],
-            'end_time': job['end_time'],
-            'exit_code': job['exit_code'],
-            'logs': list(job['logs'])  # Convert deque to list for JSON serialization
-        })
+    # Copy the fields under the job's own lock (the log deque mutates while
+    # the job runs), then serialize outside it.
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    with job['lock']:
+        logs = list(job['logs'])  # Convert deque to list for JSON serialization
+        job = dict(job)
+
+    job['logs'] = logs
+    job['start_time'] = _iso(job['start_time'])
+    job['end_time'] = _iso(job['end_time'])
+    del job['lock']
+    return jsonify(job)
 
 # ============================================================================
 # JOB EXECUTION ENGINE
 # ============================================================================
 
-class LogCapture(io.StringIO):
+class LogCapture:
     """
     Custom output stream that captures stdout/stderr and adds to job logs.
 
     This class intercepts print statements and logging output from service
     scripts and stores them in the job's log buffer line by line.
+
+    It implements the text-stream interface directly (write/flush plus the
+    attributes redirect targets are probed for) rather than inheriting from
+    io.StringIO, whose internal buffer was allocated per instance but never
+    used.
     """
 
+    encoding = 'utf-8'
+    errors = 'strict'
+
     def __init__(self, job_id):
         """
         Initialize the log capture stream.
@@ -432,39 +599,75 @@ class LogCapture(io.StringIO):
         Args:
             job_id: Job identifier to associate logs with
         """
-        super().__init__()
         self.job_id = job_id
-        self.buffer = ""  # Buffer for incomplete lines
+        self.buffer_parts = []  # Chunks of the current incomplete line
+        self.buffer_len = 0  # Total characters pending in buffer_parts
+        # Bind the job's own lock and log deque once; writes then touch
+        # neither the jobs dict nor the global lock.
+        entry = jobs[job_id]
+        self.job_lock = entry['lock']
+        self.logs = entry['logs']
+
+    def isatty(self):
+        return False
+
+    def writable(self):
+        return True
 
     def write(self, s):
         """
         Capture output and split into lines.
 
+        Incomplete-line text accumulates as a list of chunks joined only
+        when a newline actually arrives, so bursty newline-free writes
+        stay O(1) instead of re-copying a growing string each time.
+
         Args:
             s: String to write (may contain multiple lines)
 
         Returns:
             Number of characters written
         """
-        self.buffer += s
-
-        # Process complete lines
-        while '\n' in self.buffer:
-            line, self.buffer = self.buffer.split('\n', 1)
-            if line:  # Skip empty lines
-                with job_lock:
-                    if self.job_id in jobs:
-                        jobs[self.job_id]['logs'].append(line)
+        self.buffer_parts.append(s)
+        self.buffer_len += len(s)
+        if '\n' not in s:
+            # A pathological line that never ends (e.g. a dumped blob) is
+            # force-flushed truncated so pending memory stays bounded.
+            if self.buffer_len > MAX_LOG_LINE_CHARS:
+                line = ''.join(self.buffer_parts)[:MAX_LOG_LINE_CHARS] + '…[truncated]'
+                self.buffer_parts.clear()
+                self.buffer_len = 0
+                with self.job_lock:
+                    self.logs.append(line)
+            return len(s)
+
+        # Join once, split once; the trailing piece (text after the last
+        # newline) goes back into the buffer.
+        joined = ''.join(self.buffer_parts)
+        self.buffer_parts.clear()
+        lines = joined.split('\n')
+        tail = lines.pop()
+        if tail:
+            self.buffer_parts.append(tail)
+        self.buffer_len = len(tail)
+
+        # One lock acquisition and one extend per write, not per line.
+        complete = [line for line in lines if line]  # Skip empty lines
+        if complete:
+            with self.job_lock:
+                self.logs.extend(complete)
 
         return len(s)
 
     def flush(self):
         """Flush any remaining buffered output to logs."""
-        if self.buffer:
-            with job_lock:
-                if self.job_id in jobs:
-                    jobs[self.job_id]['logs'].append(self.buffer)
-            self.buffer = ""
+        if self.buffer_parts:
+            tail = ''.join(self.buffer_parts)
+            self.buffer_parts.clear()
+            self.buffer_len = 0
+            if tail:
+                with self.job_lock:
+                    self.logs.append(tail)
 
 def execute_job(job_id, service_name, params):
     """
@@ -490,72 +693,39 @@ def execute_job(job_id, service_name, params):
 
         # Validate prerequisites: Check for required API keys
         if service_name == 'fetch_prices' and not os.getenv('POLYGON_API_KEY'):
-            with job_lock:
-                jobs[job_id]['status'] = 'failed'
-                jobs[job_id]['exit_code'] = 1
-                jobs[job_id]['end_time'] = datetime.now().isoformat()
-                jobs[job_id]['logs'].append("ERROR: Polygon API key not configured!")
-                jobs[job_id]['logs'].append("Please add your API key to config.yaml under polygon.api_key")
+            entry = jobs[job_id]
+            with entry['lock']:
+                entry.update(status='failed', exit_code=1, end_time=time.time())
+                entry['logs'].append("ERROR: Polygon API key not configured!")
+                entry['logs'].append("Please add your API key to config.yaml under polygon.api_key")
             return
 
         # Prepare output capture stream
         output_capture = LogCapture(job_id)
 
-        # Save original sys.argv to restore later
-        original_argv = sys.argv.copy()
+        # Resolve the entry point and build the argument list from the
+        # registry; each main() takes argv directly, so global sys.argv is
+        # never touched and two jobs can parse arguments concurrently.
+        main_fn, build_argv = SERVICES[service_name]
+        argv = build_argv(params)
 
-        try:
-            # Build command-line arguments for the service
-            # Each service uses argparse and expects sys.argv
-            sys.argv = [service_name]
-
-            # Add service-specific parameters
-            if service_name == 'fetch_prices':
-                if 'date' in params and params['date']:
-                    sys.argv.extend(['--date', params['date']])
-
-            elif service_name == 'daily_report':
-                if 'report_date' in params and params['report_date']:
-                    sys.argv.extend(['--report-date', params['report_date']])
-
-            elif service_name == 'thirty_day_report':
-                if 'report_date' in params and params['report_date']:
-                    sys.argv.extend(['--report-date', params['report_date']])
-
-            elif service_name == 'compute_sma_events':
-                if 'short_window' in params and params['short_window']:
-                    sys.argv.extend(['--short-window', str(params['short_window'])])
-                if 'long_window' in params and params['long_window']:
-                    sys.argv.extend(['--long-window', str(params['long_window'])])
-
-            # Execute the service with output redirection
-            # All print() and logging calls will be captured
-            with redirect_stdout(output_capture), redirect_stderr(output_capture):
-                if service_name == 'fetch_prices':
-                    all_prices.main()
-                elif service_name == 'daily_report':
-                    generate_report.main()
-                elif service_name == 'thirty_day_report':
-                    thirty_day_report.main()
-                elif service_name == 'compute_sma_events':
-                    sma_events.main()
-
-            # Ensure all buffered output is written
-            output_capture.flush()
-
-            # Mark job as successfully completed
-            with job_lock:
-                jobs[job_id]['status'] = 'completed'
-                jobs[job_id]['exit_code'] = 0
-                jobs[job_id]['end_time'] = datetime.now().isoformat()
-                jobs[job_id]['logs'].append(f"Service completed successfully")
-
-            # Clean up old jobs after completion
-            cleanup_old_jobs()
-
-        finally:
-            # Always restore original sys.argv
-            sys.argv = original_argv
+        # Execute the service with output redirection
+        # All print() and logging calls will be captured
+        with redirect_stdout(output_capture), redirect_stderr(output_capture):
+            main_fn(argv)
+
+        # Ensure all buffered output is written
+        output_capture.flush()
+
+        # Mark job as successfully completed; one entry lookup and one
+        # update instead of re-hashing jobs[job_id] per field.
+        entry = jobs[job_id]
+        with entry['lock']:
+            entry.update(status='completed', exit_code=0, end_time=time.time())
+            entry['logs'].append("Service completed successfully")
+
+        # Clean up old jobs after completion
+        cleanup_old_jobs(job_id)
 
     except SystemExit as e:
         """
@@ -565,31 +735,35 @@ def execute_job(job_id, service_name, params):
         output_capture.flush()
         exit_code = e.code if e.code is not None else 0
 
-        with job_lock:
-            jobs[job_id]['status'] = 'completed' if exit_code == 0 else 'failed'
-            jobs[job_id]['exit_code'] = exit_code
-            jobs[job_id]['end_time'] = datetime.now().isoformat()
-            jobs[job_id]['logs'].append(f"Service exited with code {exit_code}")
+        entry = jobs[job_id]
+        with entry['lock']:
+            entry.update(
+                status='completed' if exit_code == 0 else 'failed',
+                exit_code=exit_code,
+                end_time=time.time(),
+            )
+            entry['logs'].append(f"Service exited with code {exit_code}")
 
         # Clean up old jobs after completion
-        cleanup_old_jobs()
+        cleanup_old_jobs(job_id)
 
     except Exception as e:
         """Handle unexpected errors during job execution."""
         output_capture.flush()
 
-        with job_lock:
-            jobs[job_id]['status'] = 'failed'
-            jobs[job_id]['exit_code'] = 1
-            jobs[job_id]['end_time'] = datetime.now().isoformat()
-            jobs[job_id]['logs'].append(f"Error: {str(e)}")
+        entry = jobs[job_id]
+        with entry['lock']:
+            entry.update(status='failed', exit_code=1, end_time=time.time())
 
-            # Add full traceback for debugging
-            jobs[job_id]['logs'].append("Traceback:")
-            jobs[job_id]['logs'].append(traceback.format_exc())
+            # Include full traceback for debugging
+            entry['logs'].extend([
+                f"Error: {str(e)}",
+                "Traceback:",
+                traceback.format_exc(),
+            ])
 
         # Clean up old jobs after failure
-        cleanup_old_jobs()
+        cleanup_old_jobs(job_id)
 
 # ============================================================================
 # MAIN APPLICATION ROUTES